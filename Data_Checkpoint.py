@@ -0,0 +1,97 @@
+import hashlib
+import sqlite3
+import threading
+
+
+def content_hash(content):
+    """Returns a short hex digest of a zipfiles content blob."""
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class IngestManifest:
+    """Checkpoint manifest for resumable, incremental ingestion.
+
+    stage_checkpoints holds the last committed num of each stage in the current run and
+    is cleared by finish_run, so a run that crashes leaves it behind for the next one to
+    resume from. row_hashes keeps the content hash of every row that has reached the
+    vector database; extraction skips rows whose hash is unchanged, so later runs only
+    process new or modified subtitles.
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        # Shared by the streaming pipeline's threads, so access goes through a lock
+        self.conn = sqlite3.connect(manifest_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS stage_checkpoints (
+                                 stage TEXT PRIMARY KEY, last_num INTEGER, complete INTEGER)''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS row_hashes (
+                                 num INTEGER PRIMARY KEY, content_hash TEXT)''')
+
+    def last_num(self, stage):
+        with self.lock:
+            row = self.conn.execute("SELECT last_num FROM stage_checkpoints WHERE stage = ?", (stage,)).fetchone()
+        return row[0] if row else 0
+
+    def is_complete(self, stage):
+        with self.lock:
+            row = self.conn.execute("SELECT complete FROM stage_checkpoints WHERE stage = ?", (stage,)).fetchone()
+        return bool(row and row[0])
+
+    def commit(self, stage, last_num, complete=False):
+        with self.lock, self.conn:
+            self._commit_stage(stage, last_num, complete)
+
+    def _commit_stage(self, stage, last_num, complete):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO stage_checkpoints (stage, last_num, complete) VALUES (?, ?, ?)",
+            (stage, int(last_num), int(complete))
+        )
+
+    def known_hashes(self, nums):
+        """Returns {num: content_hash} for the given nums that have been indexed before."""
+        nums = [int(num) for num in nums]
+        known = {}
+        with self.lock:
+            # Stay below SQLite's bound-parameter limit
+            for i in range(0, len(nums), 900):
+                part = nums[i:i + 900]
+                placeholders = ",".join("?" * len(part))
+                known.update(self.conn.execute(
+                    f"SELECT num, content_hash FROM row_hashes WHERE num IN ({placeholders})", part
+                ).fetchall())
+        return known
+
+    def commit_rows(self, stage, nums, hashes, last_num=None):
+        """Records the rows' content hashes and advances the stage checkpoint in one transaction.
+
+        last_num defaults to the largest of nums; pass it when nums includes rows (such as
+        folded near-duplicates) that lie ahead of the stage's actual progress.
+        """
+        nums = [int(num) for num in nums]
+        if not nums:
+            return
+        with self.lock, self.conn:
+            if hashes is not None:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO row_hashes (num, content_hash) VALUES (?, ?)",
+                    zip(nums, hashes)
+                )
+            self._commit_stage(stage, max(nums) if last_num is None else last_num, False)
+
+    def record_hashes(self, nums, hashes):
+        """Records rows as indexed without moving any checkpoint, e.g. rows folded into an indexed copy."""
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO row_hashes (num, content_hash) VALUES (?, ?)",
+                zip([int(num) for num in nums], hashes)
+            )
+
+    def finish_run(self):
+        """Clears the stage checkpoints once every stage has completed."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM stage_checkpoints")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,70 @@
+import pandas as pd
+
+PASSTHROUGH_COLUMNS = ["content_hash", "alt_nums", "alt_names", "alt_hashes"]
+
+
+class SubtitleChunker:
+    """Splits cleaned subtitles into time-windowed groups of cues.
+
+    Expects the cue_start and cue_end columns written by DataCleaner(keep_timestamps=True).
+    A chunk closes once its cues span window_seconds or its text would pass max_chars,
+    which keeps it inside what the MiniLM encoder reads before truncating. Documents
+    without recovered times are split on max_chars alone and get start/end of -1.0.
+    """
+
+    def __init__(self, window_seconds=60, max_chars=1000):
+        self.window_seconds = window_seconds
+        self.max_chars = max_chars
+
+    def _chunk_document(self, text, starts, ends):
+        lines = text.split("\n") if text else []
+        if starts is None or len(starts) != len(lines):
+            starts = ends = [-1.0] * len(lines)
+
+        chunks = []
+        current, chars, chunk_start, chunk_end = [], 0, -1.0, -1.0
+        for line, start, end in zip(lines, starts, ends):
+            window_full = current and chunk_start >= 0 and start - chunk_start >= self.window_seconds
+            if current and (window_full or chars + len(line) > self.max_chars):
+                chunks.append(("\n".join(current), chunk_start, chunk_end))
+                current, chars = [], 0
+
+            if not current:
+                chunk_start, chunk_end = start, end
+            current.append(line)
+            chars += len(line) + 1
+            chunk_end = max(chunk_end, end)
+
+        if current:
+            chunks.append(("\n".join(current), chunk_start, chunk_end))
+        return chunks
+
+    def chunk_frame(self, df_chunk):
+        """Turns a DataFrame of cleaned documents into one row per chunk.
+
+        The result keeps num, name, content_hash and the near-duplicate alt_* columns
+        (when present) and adds id, chunk, start and end; subtitles holds the chunk text.
+        """
+        has_times = "cue_start" in df_chunk.columns
+        passthrough = [column for column in PASSTHROUGH_COLUMNS if column in df_chunk.columns]
+
+        rows = []
+        for record in df_chunk.itertuples(index=False):
+            starts = list(record.cue_start) if has_times and record.cue_start is not None else None
+            ends = list(record.cue_end) if has_times and record.cue_end is not None else None
+            for i, (text, start, end) in enumerate(self._chunk_document(record.subtitles, starts, ends)):
+                row = {
+                    "id": f"{record.num}:{i}",
+                    "num": record.num,
+                    "name": record.name,
+                    "chunk": i,
+                    "start": float(start),
+                    "end": float(end),
+                    "subtitles": text,
+                }
+                for column in passthrough:
+                    row[column] = getattr(record, column)
+                rows.append(row)
+
+        columns = ["id", "num", "name", "chunk", "start", "end", "subtitles"] + passthrough
+        return pd.DataFrame(rows, columns=columns)
@@ -1,71 +1,359 @@
 import pyarrow.parquet as pq
 import pyarrow as pa
 import re
+from bisect import bisect_right
+from itertools import accumulate
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+UNWANTED_PHRASES = [
+    r'(?i)api\.OpenSubtitles\.org is deprecated.*?\n?',
+    r'(?i)implement REST API from OpenSubtitles\.com.*?\n?',
+    r'(?i)ENJOY ALL VOD IN HIGH QUALITY.*?\n?',
+    r'(?i)GET LIVE TV,MOVIES,SHOWS.*?\n?',
+    r'(?i)Support us and become VIP.*?\n?',
+    r'(?i)to remove all ads from.*?\n?',
+    r'(?i)Watch any video online with Open-SUBTITLES.*?\n?',
+    r'(?i)Free Browser extension: osdb\.link/ext.*?\n?',
+    r'(?i)~ subtitles started by .*? ~\n?',
+    r'(?i)~ edits & sync by .*? ~\n?',
+    r'(?i)Advertise your product or brand here.*?\n?',
+    r'(?i)contact www\.OpenSubtitles\.org.*?\n?',
+    r'(?i)ENJOY ALL VOD IN HIGH QUALITY @ KVOD.TV.*?\n?',
+    r'(?i)member.*?\n?',
+    r'(?i)www\.OpenSubtitles\.org.*?\n?',
+    r'(?i)Use the free code JOINNOW at.*?\n?',
+    r'(?i)www\.playships\.eu.*?\n?',
+    r'(?i)-== \[ www\.OpenSubtitles\.com \] ==-.*?\n?',
+    r'(?i)please rate this subtitle at www\.osdb\.link/[\w\d]+\n?',
+    r'(?i)help other users to choose the best subtitles\n?'
+]
+
+ASS_DIALOGUE_PREFIX = r'Dialogue: \d+,\d{1,2}:\d{2}:\d{2}\.\d{2},\d{1,2}:\d{2}:\d{2}\.\d{2},'
+SRT_TIMESTAMP = r'\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}'
+# Characters re.IGNORECASE folds onto an ASCII letter even though str.lower() does not
+CASEFOLD_EXCEPTIONS = ("\u0131", "\u017f")
+
+
+def remove_unwanted_phrases(text):
+    """Removes the boilerplate phrases one pattern at a time, in list order."""
+    for phrase in UNWANTED_PHRASES:
+        text = re.sub(phrase, '', text, flags=re.IGNORECASE)
+    return text
+
+
+def clean_text_reference(text):
+    """Original multi-pass cleaner, kept as the parity baseline for CleaningEngine."""
+    # Remove unwanted phrases
+    text = remove_unwanted_phrases(text)
+
+    if "[Script Info]" in text or "[V4+ Styles]" in text:
+        text = re.sub(r'\[.*?\](?:\n|$)', '', text, flags=re.MULTILINE)
+        text = re.sub(r'\{\\.*?\}', '', text)
+        text = re.sub(r'\{[^}]*\}', '', text)
+        text = re.sub(r'[^\x00-\x7F]+', '', text)
+        dialogues = re.findall(r'^' + ASS_DIALOGUE_PREFIX + r'[^,]*,[^,]*,[^,]*,[^,]*,[^,]*,[^,]*,(.*)', text, flags=re.MULTILINE)
+    else:
+        text = re.sub(r'^\d+\s*$', '', text, flags=re.MULTILINE)
+        text = re.sub(SRT_TIMESTAMP, '', text)
+        text = re.sub(r'<[^>]+>', '', text)
+        dialogues = text.split("\n")
+
+    # Clean and convert to lowercase
+    dialogues = [line.strip().lower() for line in dialogues if line.strip()]
+
+    return "\n".join(dialogues)
+
+
+class CleaningEngine:
+    """Compiled cleaner: one fused boilerplate search followed by one scan over the lines.
+
+    The boilerplate phrases are fused into one pattern and matched case-sensitively
+    against a lowercased copy of the document, which lets re skip ahead on their first
+    characters. That search only finds the lines that hold boilerplate. Those lines get
+    the reference's sequential passes, since removing one phrase can expose text or a
+    newline that a later phrase then consumes. No phrase reaches past the end of its
+    line, except to consume one trailing newline. So a run of touched lines is cleaned
+    on its own, once the next line is known to be unaffected by it.
+
+    Every per-line step reproduces its whole-text counterpart in clean_text_reference.
+    A few patterns there (braces, tags, comma fields) may run across a newline; when a
+    document contains such a case it is handed to the reference cleaner instead.
+    """
+
+    def __init__(self):
+        self.boilerplate = self._fuse(UNWANTED_PHRASES)
+
+        self.ass_override = re.compile(r'\{\\.*?\}')
+        self.ass_braces = re.compile(r'\{[^}]*\}')
+        self.non_ascii = re.compile(r'[^\x00-\x7F]+')
+        self.ass_prefix = re.compile(ASS_DIALOGUE_PREFIX)
+        # Same shape as the reference pattern, with the cue start and end captured as well
+        self.ass_dialogue = re.compile(
+            r'Dialogue: \d+,(\d{1,2}):(\d{2}):(\d{2})\.(\d{2}),(\d{1,2}):(\d{2}):(\d{2})\.(\d{2}),'
+            r'[^,\n]*,[^,\n]*,[^,\n]*,[^,\n]*,[^,\n]*,[^,\n]*,(.*)'
+        )
+
+        self.srt_index = re.compile(r'\d+\s*')
+        self.srt_timestamp = re.compile(r'(\d{2}):(\d{2}):(\d{2}),(\d{3}) --> (\d{2}):(\d{2}):(\d{2}),(\d{3})')
+        self.srt_tag = re.compile(r'<[^>]+>')
+
+    @staticmethod
+    def _fuse(phrases):
+        # Inline (?i) flags are only legal at the start; matching runs on lowercased text
+        return re.compile("|".join(f"(?:{phrase[len('(?i)'):].lower()})" for phrase in phrases))
+
+    def _strip_boilerplate(self, text):
+        """Returns text without the boilerplate phrases, or None if lowercasing cannot stand in for re.IGNORECASE."""
+        lowered = text.lower()
+        if len(lowered) != len(text) or any(ch in text for ch in CASEFOLD_EXCEPTIONS):
+            return None
+
+        lines = [line + "\n" for line in text.split("\n")]
+        lines[-1] = lines[-1][:-1]
+        ends = list(accumulate(len(line) for line in lines))
+        touched = {bisect_right(ends, match.start()) for match in self.boilerplate.finditer(lowered)}
+        if not touched:
+            return text
+
+        pieces, i = [], 0
+        while i < len(lines):
+            if i not in touched:
+                pieces.append(lines[i])
+                i += 1
+                continue
+
+            # Grow the run until the passes over it leave the following line as it is
+            end = i + 1
+            window = lines[i]
+            cleaned = remove_unwanted_phrases(window)
+            while end < len(lines):
+                following = lines[end]
+                if end not in touched and remove_unwanted_phrases(window + following) == cleaned + following:
+                    break
+                window += following
+                cleaned = remove_unwanted_phrases(window)
+                end += 1
+            pieces.append(cleaned)
+            i = end
+        return "".join(pieces)
+
+    def clean(self, text):
+        return self.clean_with_times(text, keep_times=False)[0]
+
+    def clean_with_times(self, text, keep_times=True):
+        """Returns the cleaned text with the cue start and end (in seconds) of each output line.
+
+        The time lists are None when the document had to go through the reference
+        cleaner; lines that appear before the first cue get -1.0.
+        """
+        stripped = self._strip_boilerplate(text)
+        if stripped is None:
+            return clean_text_reference(text), None, None
+
+        times = [] if keep_times else None
+        if "[Script Info]" in stripped or "[V4+ Styles]" in stripped:
+            dialogues = self._scan_ass(stripped, times)
+        else:
+            dialogues = self._scan_srt(stripped, times)
+
+        if dialogues is None:
+            return clean_text_reference(text), None, None
+
+        cleaned = "\n".join(dialogues).lower()
+        if not keep_times:
+            return cleaned, None, None
+        return cleaned, [start for start, _ in times], [end for _, end in times]
+
+    @staticmethod
+    def _seconds(hours, minutes, seconds, fraction):
+        return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(fraction) / 10 ** len(fraction)
+
+    def _scan_ass(self, text, times=None):
+        """Returns the dialogue text of an ASS document, or None if it needs the reference cleaner."""
+        override_sub = self.ass_override.sub
+        braces_sub = self.ass_braces.sub
+        non_ascii_sub = self.non_ascii.sub
+        dialogue_match = self.ass_dialogue.match
+
+        dialogues = []
+        pending = ""
+        raw_lines = text.split("\n")
+        last = len(raw_lines) - 1
+        for i, line in enumerate(raw_lines):
+            # A trailing [..] is dropped together with its newline, which glues whatever
+            # precedes it onto the next line
+            if line.endswith("]") and "[" in line:
+                pending += line[:line.index("[")]
+                if i != last:
+                    continue
+                line = pending
+            elif pending:
+                line = pending + line
+                pending = ""
+
+            if "{" in line:
+                line = braces_sub('', override_sub('', line))
+                if "{" in line:
+                    return None
+            if not line.isascii():
+                line = non_ascii_sub('', line)
+            if not line.startswith("Dialogue: "):
+                continue
+
+            match = dialogue_match(line)
+            if match is None:
+                # The reference pattern's comma fields could continue onto the next line
+                if self.ass_prefix.match(line):
+                    return None
+                continue
+
+            dialogue = match.group(9).strip()
+            if dialogue:
+                dialogues.append(dialogue)
+                if times is not None:
+                    times.append((self._seconds(*match.group(1, 2, 3, 4)), self._seconds(*match.group(5, 6, 7, 8))))
+
+        return dialogues
+
+    def _scan_srt(self, text, times=None):
+        """Returns the dialogue lines of an SRT document, or None if it needs the reference cleaner."""
+        index_match = self.srt_index.fullmatch
+        timestamp_sub = self.srt_timestamp.sub
+        tag_sub = self.srt_tag.sub
+
+        dialogues = []
+        cue = (-1.0, -1.0)
+        for line in text.split("\n"):
+            if line[:1].isdigit() and index_match(line):
+                continue
+            if "-->" in line:
+                if times is not None:
+                    match = self.srt_timestamp.search(line)
+                    if match:
+                        cue = (self._seconds(*match.group(1, 2, 3, 4)), self._seconds(*match.group(5, 6, 7, 8)))
+                line = timestamp_sub('', line)
+            if "<" in line:
+                line = tag_sub('', line)
+                # An unclosed tag could run on into the following lines
+                if "<" in line:
+                    return None
+
+            line = line.strip()
+            if line:
+                dialogues.append(line)
+                if times is not None:
+                    times.append(cue)
+
+        return dialogues
+
+
+_ENGINE = None
+
+
+def _get_engine():
+    """Returns this process's CleaningEngine, compiling it on first use."""
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = CleaningEngine()
+    return _ENGINE
+
+
+def _clean_frame(df_chunk, keep_timestamps=False):
+    """Cleans the subtitles column of a DataFrame in place and returns it.
+
+    With keep_timestamps, cue_start and cue_end columns hold the cue times of every
+    cleaned line (None when the document's times could not be recovered).
+    """
+    if 'subtitles' not in df_chunk.columns:
+        raise KeyError("The 'subtitles' column is missing in the Parquet file.")
+
+    engine = _get_engine()
+    if not keep_timestamps:
+        df_chunk['subtitles'] = df_chunk['subtitles'].astype(str).apply(engine.clean)
+        return df_chunk
+
+    results = [engine.clean_with_times(text) for text in df_chunk['subtitles'].astype(str)]
+    df_chunk['subtitles'] = [cleaned for cleaned, _, _ in results]
+    df_chunk['cue_start'] = [starts for _, starts, _ in results]
+    df_chunk['cue_end'] = [ends for _, _, ends in results]
+    return df_chunk
+
+
+def frame_to_table(df_chunk):
+    """Converts a cleaned DataFrame to an Arrow table with a stable schema."""
+    table = pa.Table.from_pandas(df_chunk)
+    # A batch where no times were recovered would otherwise be typed list<null>
+    for column in ('cue_start', 'cue_end'):
+        if column in table.column_names:
+            index = table.column_names.index(column)
+            table = table.set_column(index, column, table.column(column).cast(pa.list_(pa.float64())))
+    return table
+
+
+def _clean_row_groups(input_parquet, row_groups, keep_timestamps=False):
+    """Worker entry point: reads and cleans a run of row groups inside a pool process."""
+    table = pq.ParquetFile(input_parquet).read_row_groups(row_groups)
+    return frame_to_table(_clean_frame(table.to_pandas(), keep_timestamps))
+
 
 class DataCleaner:
-    def __init__(self, input_parquet, output_parquet):
+    def __init__(self, input_parquet, output_parquet, num_workers=1, batch_size=10_000, max_inflight=None,
+                 keep_timestamps=False, mp_context=None):
         self.input_parquet = input_parquet
         self.output_parquet = output_parquet
+        # Keep per-line cue times so SubtitleChunker can build time-windowed chunks
+        self.keep_timestamps = keep_timestamps
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight or 2 * num_workers
+        # multiprocessing context for the pool; None uses the platform default
+        self.mp_context = mp_context
+        self.engine = _get_engine()
 
     def clean_text(self, text):
-        unwanted_phrases = [
-            r'(?i)api\.OpenSubtitles\.org is deprecated.*?\n?',
-            r'(?i)implement REST API from OpenSubtitles\.com.*?\n?',
-            r'(?i)ENJOY ALL VOD IN HIGH QUALITY.*?\n?',
-            r'(?i)GET LIVE TV,MOVIES,SHOWS.*?\n?',
-            r'(?i)Support us and become VIP.*?\n?',
-            r'(?i)to remove all ads from.*?\n?',
-            r'(?i)Watch any video online with Open-SUBTITLES.*?\n?',
-            r'(?i)Free Browser extension: osdb\.link/ext.*?\n?',
-            r'(?i)~ subtitles started by .*? ~\n?',
-            r'(?i)~ edits & sync by .*? ~\n?',
-            r'(?i)Advertise your product or brand here.*?\n?',
-            r'(?i)contact www\.OpenSubtitles\.org.*?\n?',
-            r'(?i)ENJOY ALL VOD IN HIGH QUALITY @ KVOD.TV.*?\n?',
-            r'(?i)member.*?\n?',
-            r'(?i)www\.OpenSubtitles\.org.*?\n?',
-            r'(?i)Use the free code JOINNOW at.*?\n?',
-            r'(?i)www\.playships\.eu.*?\n?',
-            r'(?i)-== \[ www\.OpenSubtitles\.com \] ==-.*?\n?',
-            r'(?i)please rate this subtitle at www\.osdb\.link/[\w\d]+\n?',
-            r'(?i)help other users to choose the best subtitles\n?'
-        ]
-
-        # Remove unwanted phrases
-        for phrase in unwanted_phrases:
-            text = re.sub(phrase, '', text, flags=re.IGNORECASE)
-
-        if "[Script Info]" in text or "[V4+ Styles]" in text:
-            text = re.sub(r'\[.*?\](?:\n|$)', '', text, flags=re.MULTILINE)
-            text = re.sub(r'\{\\.*?\}', '', text)
-            text = re.sub(r'\{[^}]*\}', '', text)
-            text = re.sub(r'[^\x00-\x7F]+', '', text)
-            dialogues = re.findall(r'^Dialogue: \d+,\d{1,2}:\d{2}:\d{2}\.\d{2},\d{1,2}:\d{2}:\d{2}\.\d{2},[^,]*,[^,]*,[^,]*,[^,]*,[^,]*,[^,]*,(.*)', text, flags=re.MULTILINE)
-        else:
-            text = re.sub(r'^\d+\s*$', '', text, flags=re.MULTILINE)
-            text = re.sub(r'\d{2}:\d{2}:\d{2},\d{3} --> \d{2}:\d{2}:\d{2},\d{3}', '', text)
-            text = re.sub(r'<[^>]+>', '', text)
-            dialogues = text.split("\n")
+        return self.engine.clean(text)
 
-        # Clean and convert to lowercase
-        dialogues = [line.strip().lower() for line in dialogues if line.strip()]
-        
-        return "\n".join(dialogues)
+    def _row_group_runs(self, parquet_file):
+        """Groups consecutive row groups into runs of roughly batch_size rows."""
+        run, rows = [], 0
+        for i in range(parquet_file.num_row_groups):
+            run.append(i)
+            rows += parquet_file.metadata.row_group(i).num_rows
+            if rows >= self.batch_size:
+                yield run
+                run, rows = [], 0
+        if run:
+            yield run
 
-    def clean_subtitles(self):
-        parquet_file = pq.ParquetFile(self.input_parquet)
-        writer = None  
+    def clean_frames(self, frames):
+        """Yields each DataFrame from frames with its subtitles cleaned, in input order."""
+        if self.num_workers <= 1:
+            for df_chunk in frames:
+                yield _clean_frame(df_chunk, self.keep_timestamps)
+            return
 
-        try:
-            for i, batch in enumerate(parquet_file.iter_batches(batch_size=10_000)):
-                df_chunk = batch.to_pandas()
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=self.mp_context) as executor:
+            for df_chunk in frames:
+                pending.append(executor.submit(_clean_frame, df_chunk, self.keep_timestamps))
+                if len(pending) >= self.max_inflight:
+                    yield pending.popleft().result()
 
-                if 'subtitles' not in df_chunk.columns:
-                    raise KeyError("The 'subtitles' column is missing in the Parquet file.")
+            while pending:
+                yield pending.popleft().result()
 
-                df_chunk['subtitles'] = df_chunk['subtitles'].astype(str).apply(self.clean_text)
+    def clean_subtitles(self):
+        if self.num_workers > 1:
+            return self._clean_subtitles_parallel()
 
-                table = pa.Table.from_pandas(df_chunk)
+        parquet_file = pq.ParquetFile(self.input_parquet)
+        frames = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=self.batch_size))
+        writer = None
+
+        try:
+            for i, df_chunk in enumerate(self.clean_frames(frames)):
+                table = frame_to_table(df_chunk)
 
                 if writer is None:
                     writer = pq.ParquetWriter(self.output_parquet, table.schema)
@@ -77,4 +365,36 @@ class DataCleaner:
             if writer:
                 writer.close()
 
-        print(f"✅ Cleaned subtitles saved to: {self.output_parquet}")
\ No newline at end of file
+        print(f"✅ Cleaned subtitles saved to: {self.output_parquet}")
+
+    def _clean_subtitles_parallel(self):
+        """Cleans runs of row groups in a process pool, writing them back in file order."""
+        parquet_file = pq.ParquetFile(self.input_parquet)
+        writer = None
+        pending = deque()
+        batch_count = 0
+
+        def drain_one():
+            nonlocal writer, batch_count
+            table = pending.popleft().result()
+            if writer is None:
+                writer = pq.ParquetWriter(self.output_parquet, table.schema)
+            writer.write_table(table)
+            batch_count += 1
+            print(f"✅ Processed batch {batch_count} with {table.num_rows} rows")
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=self.mp_context) as executor:
+                for run in self._row_group_runs(parquet_file):
+                    pending.append(executor.submit(_clean_row_groups, self.input_parquet, run, self.keep_timestamps))
+                    if len(pending) >= self.max_inflight:
+                        drain_one()
+
+                while pending:
+                    drain_one()
+
+        finally:
+            if writer:
+                writer.close()
+
+        print(f"✅ Cleaned subtitles saved to: {self.output_parquet}")
@@ -0,0 +1,398 @@
+import sqlite3
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from numpy.lib.stride_tricks import sliding_window_view
+from Data_Cleaner import frame_to_table
+
+EMPTY_BIN = np.iinfo(np.uint64).max
+ALT_COLUMN_TYPES = {"alt_nums": pa.int64(), "alt_names": pa.string(), "alt_hashes": pa.string()}
+
+# Multipliers from splitmix64, used to scramble packed shingles into uniform 64-bit hashes
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(values):
+    values = values ^ (values >> np.uint64(30))
+    values = values * _MIX1
+    values = values ^ (values >> np.uint64(27))
+    values = values * _MIX2
+    return values ^ (values >> np.uint64(31))
+
+
+def minhash_signature(text, num_perm=128, shingle_size=8):
+    """Returns the one-permutation MinHash signature of a document's byte shingles.
+
+    Whitespace is collapsed first, so re-wrapped lines do not change the signature. Each
+    shingle is hashed once and the hash space is split into num_perm bins; a bin holds
+    the smallest hash that falls in it, or EMPTY_BIN when none does.
+    """
+    data = np.frombuffer(" ".join(text.split()).encode("utf-8"), dtype=np.uint8)
+    signature = np.full(num_perm, EMPTY_BIN, dtype=np.uint64)
+    if len(data) == 0:
+        return signature
+    if len(data) < shingle_size:
+        data = np.pad(data, (0, shingle_size - len(data)))
+
+    windows = sliding_window_view(data, shingle_size)
+    packed = np.zeros(len(windows), dtype=np.uint64)
+    for i in range(shingle_size):
+        packed |= windows[:, i].astype(np.uint64) << np.uint64(8 * i)
+
+    # Sorted unique hashes: the first hash of each bin is that bin's minimum
+    hashes = np.unique(_mix(packed))
+    bins = hashes >> np.uint64(64 - (num_perm.bit_length() - 1))
+    first = np.searchsorted(bins, np.arange(num_perm, dtype=np.uint64))
+    found = first < len(hashes)
+    found[found] = bins[first[found]] == np.arange(num_perm, dtype=np.uint64)[found]
+    signature[found] = hashes[first[found]]
+    return signature
+
+
+def estimate_jaccard(signature, others):
+    """Estimates the Jaccard similarity between one signature and each row of others."""
+    both_empty = (signature == EMPTY_BIN) & (others == EMPTY_BIN)
+    matches = ((signature == others) & ~both_empty).sum(axis=1)
+    compared = (~both_empty).sum(axis=1)
+    return np.divide(matches, compared, out=np.zeros(len(others)), where=compared > 0)
+
+
+def _signatures(texts, num_perm, shingle_size):
+    """Worker entry point: computes the signatures of a batch of documents."""
+    if not len(texts):
+        return np.empty((0, num_perm), dtype=np.uint64)
+    return np.stack([minhash_signature(str(text), num_perm, shingle_size) for text in texts])
+
+
+class SignatureIndex:
+    """MinHash signatures and LSH band keys of canonical rows, kept in SQLite between runs.
+
+    Later runs only see new or changed subtitles, so without this they could not fold a
+    new release into a copy indexed by an earlier run. folded records which canonical
+    each such release went into. Delete the file along with the ingest manifest to
+    rebuild from scratch.
+    """
+
+    def __init__(self, index_path, num_perm, bands, shingle_size):
+        # Shared by the streaming pipeline's threads, so access goes through a lock
+        self.conn = sqlite3.connect(index_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS settings (num_perm INTEGER, bands INTEGER, shingle_size INTEGER)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS signatures (num INTEGER PRIMARY KEY, signature BLOB)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER, key INTEGER, num INTEGER)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS bands_by_key ON bands (band, key)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS bands_by_num ON bands (num)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS folded (num INTEGER PRIMARY KEY, canonical INTEGER, name TEXT)")
+            self.conn.execute("CREATE TEMP TABLE probe (row INTEGER, band INTEGER, key INTEGER)")
+
+            settings = (num_perm, bands, shingle_size)
+            stored = self.conn.execute("SELECT num_perm, bands, shingle_size FROM settings").fetchone()
+            if stored is None:
+                self.conn.execute("INSERT INTO settings VALUES (?, ?, ?)", settings)
+            elif tuple(stored) != settings:
+                raise ValueError(f"{index_path} was built with num_perm, bands, shingle_size = {tuple(stored)}.")
+
+    def _delete(self, table, nums):
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(nums), 900):
+            part = nums[i:i + 900]
+            self.conn.execute(f"DELETE FROM {table} WHERE num IN ({','.join('?' * len(part))})", part)
+
+    def remove(self, nums):
+        """Forgets rows that are being processed again, so they do not match their old copies."""
+        nums = [int(num) for num in nums]
+        with self.lock, self.conn:
+            for table in ("signatures", "bands", "folded"):
+                self._delete(table, nums)
+
+    def add(self, nums, signatures, keys, usable):
+        rows, bands = np.nonzero(usable)
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO signatures (num, signature) VALUES (?, ?)",
+                                  zip(nums.tolist(), (signature.tobytes() for signature in signatures)))
+            # SQLite integers are signed, so keys are stored as their int64 bit pattern
+            self.conn.executemany("INSERT INTO bands (band, key, num) VALUES (?, ?, ?)",
+                                  zip(bands.tolist(), keys[rows, bands].view(np.int64).tolist(), nums[rows].tolist()))
+
+    def signatures(self, nums):
+        """Returns {num: signature} for the given indexed nums."""
+        nums = [int(num) for num in nums]
+        found = {}
+        with self.lock:
+            for i in range(0, len(nums), 900):
+                part = nums[i:i + 900]
+                found.update(
+                    (num, np.frombuffer(blob, dtype=np.uint64))
+                    for num, blob in self.conn.execute(
+                        f"SELECT num, signature FROM signatures WHERE num IN ({','.join('?' * len(part))})", part
+                    )
+                )
+        return found
+
+    def match(self, nums, signatures, keys, usable, threshold):
+        """Returns {num: indexed num} for rows that are near-duplicates of an indexed row.
+
+        Candidates share a band key with the row; the lowest indexed num whose estimated
+        Jaccard similarity reaches threshold wins, as it does within a run.
+        """
+        rows, bands = np.nonzero(usable)
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO probe (row, band, key) VALUES (?, ?, ?)",
+                                  zip(rows.tolist(), bands.tolist(), keys[rows, bands].view(np.int64).tolist()))
+            pairs = self.conn.execute(
+                "SELECT DISTINCT probe.row, bands.num FROM probe JOIN bands ON bands.band = probe.band "
+                "AND bands.key = probe.key ORDER BY bands.num"
+            ).fetchall()
+            self.conn.execute("DELETE FROM probe")
+
+        indexed = self.signatures({num for _, num in pairs})
+        matches = {}
+        for row, num in pairs:
+            if int(nums[row]) not in matches and estimate_jaccard(signatures[row], indexed[num][None])[0] >= threshold:
+                matches[int(nums[row])] = num
+        return matches
+
+    def record_folded(self, nums, canonicals, names):
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO folded (num, canonical, name) VALUES (?, ?, ?)",
+                                  zip(nums, canonicals, names))
+
+    def close(self):
+        self.conn.close()
+
+
+class SubtitleDeduplicator:
+    """Collapses near-identical subtitles (re-rips, re-syncs, re-uploads) before embedding.
+
+    The first pass computes a MinHash signature per cleaned document. Signatures are
+    split into bands for locality-sensitive hashing, and documents that share a band
+    are merged into one group when their estimated Jaccard similarity reaches
+    threshold. The second pass writes only the lowest num of each group, with the
+    other members' num, name and content_hash in alt_nums, alt_names and alt_hashes.
+
+    With index_path, the canonical rows' signatures are kept in a SignatureIndex, and
+    groups that match a row indexed by an earlier run are folded into it and left out
+    of the output. Those rows are not added to the indexed copy's alt_* metadata, which
+    is not rewritten; the index's folded table lists them. With a manifest, their
+    hashes are recorded as indexed so extraction skips them from then on.
+    deduplicate_frames applies the same folding to the streaming pipeline's frames.
+    """
+
+    def __init__(self, input_parquet, output_parquet, threshold=0.8, num_perm=128, bands=32, shingle_size=8,
+                 num_workers=1, batch_size=10_000, max_inflight=None, index_path=None, manifest=None):
+        if num_perm & (num_perm - 1) or num_perm % bands:
+            raise ValueError("num_perm must be a power of two divisible by bands.")
+        if not 1 <= shingle_size <= 8:
+            raise ValueError("shingle_size must be between 1 and 8 bytes.")
+
+        self.input_parquet = input_parquet
+        self.output_parquet = output_parquet
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        self.num_workers = num_workers
+        self.batch_size = batch_size
+        self.max_inflight = max_inflight or 2 * num_workers
+        self.signature_index = SignatureIndex(index_path, num_perm, bands, shingle_size) if index_path else None
+        self.manifest = manifest
+
+    def _iter_signatures(self, batches):
+        if self.num_workers <= 1:
+            for texts in batches:
+                yield _signatures(texts, self.num_perm, self.shingle_size)
+            return
+
+        pending = deque()
+        with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+            for texts in batches:
+                pending.append(executor.submit(_signatures, texts, self.num_perm, self.shingle_size))
+                if len(pending) >= self.max_inflight:
+                    yield pending.popleft().result()
+
+            while pending:
+                yield pending.popleft().result()
+
+    def compute_signatures(self):
+        """Returns (nums, signatures) for every document in the input Parquet file."""
+        parquet_file = pq.ParquetFile(self.input_parquet)
+        nums = []
+
+        def texts():
+            for batch in parquet_file.iter_batches(batch_size=self.batch_size, columns=["num", "subtitles"]):
+                nums.extend(batch.column("num").to_pylist())
+                yield batch.column("subtitles").to_pylist()
+
+        parts = list(self._iter_signatures(texts()))
+        signatures = np.vstack(parts) if parts else np.empty((0, self.num_perm), dtype=np.uint64)
+        return np.asarray(nums, dtype=np.int64), signatures
+
+    def band_keys(self, signatures):
+        """Returns the LSH key of each signature's bands, and whether each band holds any shingle."""
+        rows = self.num_perm // self.bands
+        blocks = signatures.reshape(len(signatures), self.bands, rows)
+        keys = blocks[:, :, 0].copy()
+        for r in range(1, rows):
+            keys = _mix(keys ^ blocks[:, :, r])
+        # A band with no shingles in any of its bins says nothing about similarity
+        return keys, ~(blocks == EMPTY_BIN).all(axis=2)
+
+    def group(self, nums, signatures):
+        """Returns {canonical num: [duplicate nums]} for every group with more than one member."""
+        parent = np.arange(len(nums))
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        band_keys, usable = self.band_keys(signatures)
+        for band in range(self.bands):
+            keys = band_keys[:, band]
+            candidates = np.flatnonzero(usable[:, band])
+            order = candidates[np.argsort(keys[candidates], kind="stable")]
+            sorted_keys = keys[order]
+            starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            ends = np.r_[starts[1:], len(order)]
+
+            for start, end in zip(starts, ends):
+                if end - start < 2:
+                    continue
+                leader, members = order[start], order[start + 1:end]
+                similar = members[estimate_jaccard(signatures[leader], signatures[members]) >= self.threshold]
+                root = find(leader)
+                for member in similar:
+                    other = find(member)
+                    if other != root:
+                        # Keep the lowest num at the root so it becomes the canonical copy
+                        if nums[other] < nums[root]:
+                            root, other = other, root
+                        parent[other] = root
+
+        groups = {}
+        for i in range(len(nums)):
+            root = find(i)
+            if root != i:
+                groups.setdefault(int(nums[root]), []).append(int(nums[i]))
+        return groups
+
+    def fold(self, nums, signatures):
+        """Groups near-duplicates among nums and, with a signature index, against earlier runs.
+
+        Returns (groups, folded): groups as from group(), and folded mapping each row that
+        duplicates a previously indexed row (with its own duplicates) to that row's num.
+        The index then holds this batch's canonical rows.
+        """
+        groups = self.group(nums, signatures)
+        folded = {}
+        if self.signature_index is None:
+            return groups, folded
+
+        self.signature_index.remove(nums)
+        keys, usable = self.band_keys(signatures)
+        canonical = np.flatnonzero(~np.isin(nums, [num for members in groups.values() for num in members]))
+        matches = self.signature_index.match(nums[canonical], signatures[canonical], keys[canonical],
+                                             usable[canonical], self.threshold)
+        for num, indexed in matches.items():
+            for member in [num] + groups.pop(num, []):
+                folded[member] = indexed
+
+        keep = canonical[~np.isin(nums[canonical], list(folded))]
+        self.signature_index.add(nums[keep], signatures[keep], keys[keep], usable[keep])
+        return groups, folded
+
+    def _record_folded(self, folded, alternates):
+        """Stores which indexed row each folded row went into, and marks the rows as indexed."""
+        if not folded:
+            return
+        nums = list(folded)
+        self.signature_index.record_folded(nums, [folded[num] for num in nums], [alternates[num][0] for num in nums])
+        if self.manifest is not None and all(alternates[num][1] is not None for num in nums):
+            self.manifest.record_hashes(nums, [alternates[num][1] for num in nums])
+
+    def _with_alternates(self, df_chunk, groups, alternates, has_hash):
+        members = [groups.get(int(num), []) for num in df_chunk["num"]]
+        df_chunk["alt_nums"] = members
+        df_chunk["alt_names"] = [[alternates[num][0] for num in group] for group in members]
+        if has_hash:
+            df_chunk["alt_hashes"] = [[alternates[num][1] for num in group] for group in members]
+        return df_chunk
+
+    def deduplicate_frames(self, frames):
+        """Yields each DataFrame of cleaned subtitles with its near-duplicates folded.
+
+        For the streaming pipeline: rows are grouped within each frame, and across frames
+        and runs through the signature index.
+        """
+        for df_chunk in frames:
+            nums = df_chunk["num"].to_numpy(dtype=np.int64)
+            groups, folded = self.fold(nums, _signatures(df_chunk["subtitles"].tolist(), self.num_perm, self.shingle_size))
+            dropped = {num for members in groups.values() for num in members} | set(folded)
+
+            has_hash = "content_hash" in df_chunk.columns
+            alternates = {
+                int(record.num): (record.name, record.content_hash if has_hash else None)
+                for record in df_chunk[df_chunk["num"].isin(dropped)].itertuples(index=False)
+            }
+            self._record_folded(folded, alternates)
+            if dropped:
+                print(f"🧬 Folded {len(dropped)} of {len(df_chunk)} subtitles into near-duplicates")
+            df_chunk = df_chunk[~df_chunk["num"].isin(dropped)].reset_index(drop=True)
+            yield self._with_alternates(df_chunk, groups, alternates, has_hash)
+
+    def _to_table(self, df_chunk):
+        table = frame_to_table(df_chunk)
+        for column, value_type in ALT_COLUMN_TYPES.items():
+            if column in table.column_names:
+                index = table.column_names.index(column)
+                table = table.set_column(index, column, table.column(column).cast(pa.list_(value_type)))
+        return table
+
+    def deduplicate(self):
+        """Writes one canonical row per group of near-duplicates and returns the number of rows dropped."""
+        nums, signatures = self.compute_signatures()
+        groups, folded = self.fold(nums, signatures)
+        duplicates = {num for members in groups.values() for num in members}
+        dropped = duplicates | set(folded)
+
+        # The second pass needs each duplicate's name and hash to attach to its canonical row
+        parquet_file = pq.ParquetFile(self.input_parquet)
+        has_hash = "content_hash" in parquet_file.schema_arrow.names
+        alternates = {}
+        if dropped:
+            columns = ["num", "name"] + (["content_hash"] if has_hash else [])
+            for batch in parquet_file.iter_batches(batch_size=self.batch_size, columns=columns):
+                df_chunk = batch.to_pandas()
+                df_chunk = df_chunk[df_chunk["num"].isin(dropped)]
+                for record in df_chunk.itertuples(index=False):
+                    alternates[int(record.num)] = (record.name, record.content_hash if has_hash else None)
+
+        writer = None
+        try:
+            for i, batch in enumerate(parquet_file.iter_batches(batch_size=self.batch_size)):
+                df_chunk = batch.to_pandas()
+                df_chunk = df_chunk[~df_chunk["num"].isin(dropped)].reset_index(drop=True)
+                table = self._to_table(self._with_alternates(df_chunk, groups, alternates, has_hash))
+                if writer is None:
+                    writer = pq.ParquetWriter(self.output_parquet, table.schema)
+                writer.write_table(table)
+                print(f"✅ Processed batch {i+1} with {len(df_chunk)} canonical rows")
+
+        finally:
+            if writer:
+                writer.close()
+        self._record_folded(folded, alternates)
+
+        total = len(nums)
+        print(f"🧬 Near-duplicates: {len(duplicates)} of {total} subtitles folded into {len(groups)} groups "
+              f"({len(duplicates) / total if total else 0.0:.1%} fewer to embed)")
+        if folded:
+            print(f"🧬 {len(folded)} subtitles folded into copies indexed by earlier runs")
+        print(f"✅ Deduplicated subtitles saved to: {self.output_parquet}")
+        return len(dropped)
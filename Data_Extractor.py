@@ -1,17 +1,91 @@
+import codecs
+import glob
+import os
 import sqlite3
+import time
 import zipfile
 import io
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 import chardet
 import pandas as pd
 import pyarrow.parquet as pq
 import pyarrow as pa
+from Data_Checkpoint import content_hash
+
+
+def _extract_batch(extractor, contents):
+    """Worker entry point: extracts a batch of ZIP blobs inside a pool process."""
+    start = time.perf_counter()
+    extractor.decode_stats = Counter()
+    subtitles = [extractor.extract_full_subtitle(content) for content in contents]
+    return os.getpid(), subtitles, time.perf_counter() - start, extractor.decode_stats
+
+
+# Byte-order marks checked before any decoding, longest first so UTF-32 wins over UTF-16
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+]
+DECODE_TIERS = ["bom", "utf8", "detect", "fallback"]
+
 
 class DataExtractor:
-    def __init__(self, db_path, output_parquet, chunk_size=500, overlap=50):
+    def __init__(self, db_path, output_parquet, chunk_size=500, overlap=50, num_workers=1, max_inflight=None,
+                 detect_sample_size=65536, manifest=None, start_num=0, checkpoint_chunks=20, mp_context=None):
         self.db_path = db_path
         self.output_parquet = output_parquet
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.num_workers = num_workers
+        # Number of chunks allowed in the pool at once (defaults to two per worker)
+        self.max_inflight = max_inflight or 2 * num_workers
+        # multiprocessing context for the pool; None uses the platform default
+        self.mp_context = mp_context
+        # Bytes handed to chardet when a file is not valid UTF-8
+        self.detect_sample_size = detect_sample_size
+        self.decode_stats = Counter()
+        # With a manifest, rows whose content hash is unchanged since they were indexed are skipped
+        self.manifest = manifest
+        self.start_num = start_num
+        self.last_num = start_num
+        # With a manifest, the extract checkpoint advances every checkpoint_chunks chunks
+        self.checkpoint_chunks = checkpoint_chunks
+        self.skipped_rows = 0
+
+    def __getstate__(self):
+        # Pool workers only decode, so the manifest's SQLite connection stays in this process
+        state = self.__dict__.copy()
+        state["manifest"] = None
+        return state
+
+    def _decode(self, raw):
+        """Decodes raw subtitle bytes, trying cheap exact decoders before chardet."""
+        for bom, encoding in BOMS:
+            if raw.startswith(bom):
+                self.decode_stats["bom"] += 1
+                return raw[len(bom):].decode(encoding, errors="ignore")
+
+        try:
+            text = raw.decode("utf-8")
+            self.decode_stats["utf8"] += 1
+            return text
+        except UnicodeDecodeError:
+            pass
+
+        start = time.perf_counter()
+        detected_encoding = chardet.detect(raw[:self.detect_sample_size])["encoding"]
+        self.decode_stats["detect_seconds"] += time.perf_counter() - start
+
+        if detected_encoding is None:
+            self.decode_stats["fallback"] += 1
+            return raw.decode("cp1252", errors="ignore")
+
+        self.decode_stats["detect"] += 1
+        return raw.decode(detected_encoding, errors="ignore")
 
     def extract_full_subtitle(self, content):
         zip_bytes = io.BytesIO(content)
@@ -20,13 +94,8 @@ class DataExtractor:
         try:
             with zipfile.ZipFile(zip_bytes, "r") as zip_ref:
                 for file in zip_ref.namelist():
-                    with zip_ref.open(file) as subtitle_file:
-                        chunk = subtitle_file.read(1048576)  
-                        detected_encoding = chardet.detect(chunk)["encoding"]
-
-                        subtitle_file.seek(0)
-                        subtitle_text = subtitle_file.read().decode(detected_encoding, errors="ignore")
-                        break  
+                    subtitle_text = self._decode(zip_ref.read(file))
+                    break
 
         except zipfile.BadZipFile:
             subtitle_text = "[Invalid ZIP File]"
@@ -35,36 +104,177 @@ class DataExtractor:
 
         return subtitle_text
 
-    def extract_subtitles(self):
+    def print_decode_stats(self):
+        stats = self.decode_stats
+        decoded = sum(stats[tier] for tier in DECODE_TIERS)
+        summary = ", ".join(f"{tier}={stats[tier]}" for tier in DECODE_TIERS)
+        print(f"📊 Decoded {decoded} files ({summary}); "
+              f"chardet time {stats['detect_seconds']:.2f}s")
+        if self.manifest is not None:
+            print(f"📊 Skipped {self.skipped_rows} unchanged rows.")
+
+    def _read_chunks(self, conn):
+        """Yields ordered row chunks from the zipfiles table."""
+        last_num = self.start_num
+        while True:
+            query = f"""
+                SELECT num, name, content FROM zipfiles
+                WHERE num > {last_num}
+                ORDER BY num ASC
+                LIMIT {self.chunk_size + self.overlap}
+            """
+            df_chunk = pd.read_sql_query(query, conn)
+            if df_chunk.empty:
+                break
+
+            last_num = df_chunk["num"].max()
+            self.last_num = last_num
+            if self.manifest is not None:
+                df_chunk = self._drop_unchanged(df_chunk)
+                if df_chunk.empty:
+                    continue
+            yield df_chunk
+
+    def _drop_unchanged(self, df_chunk):
+        df_chunk["content_hash"] = [content_hash(content) for content in df_chunk["content"]]
+        known = self.manifest.known_hashes(df_chunk["num"])
+        changed = [known.get(num) != digest for num, digest in zip(df_chunk["num"], df_chunk["content_hash"])]
+        self.skipped_rows += len(changed) - sum(changed)
+        return df_chunk[changed].reset_index(drop=True)
+
+    def _attach_subtitles(self, df_chunk, subtitles):
+        df_chunk["subtitles"] = subtitles
+        df_chunk.drop(columns=["content"], inplace=True)
+        return df_chunk
+
+    def iter_subtitle_chunks(self):
+        """Yields (num, name, subtitles) DataFrames in num order, one per chunk read from the database."""
+        if self.num_workers > 1:
+            yield from self._iter_subtitle_chunks_parallel()
+            return
+
         conn = sqlite3.connect(self.db_path)
-        writer = None
-        last_num = 0
+        try:
+            for df_chunk in self._read_chunks(conn):
+                subtitles = df_chunk["content"].apply(self.extract_full_subtitle)
+                yield self._attach_subtitles(df_chunk, subtitles)
+        finally:
+            conn.close()
+        self.print_decode_stats()
+
+    def _iter_subtitle_chunks_parallel(self):
+        """Decodes chunks in a process pool while keeping the output in num order."""
+        conn = sqlite3.connect(self.db_path)
+        pending = deque()
+        worker_stats = {}
+
+        def drain_one():
+            df_chunk, future = pending.popleft()
+            pid, subtitles, elapsed, decode_stats = future.result()
+            self.decode_stats.update(decode_stats)
+            rows, busy = worker_stats.get(pid, (0, 0.0))
+            worker_stats[pid] = (rows + len(subtitles), busy + elapsed)
+            return self._attach_subtitles(df_chunk, subtitles)
 
         try:
-            while True:
-                query = f"""
-                    SELECT num, name, content FROM zipfiles 
-                    WHERE num > {last_num}
-                    ORDER BY num ASC
-                    LIMIT {self.chunk_size + self.overlap}
-                """
-                df_chunk = pd.read_sql_query(query, conn)
-                if df_chunk.empty:
+            with ProcessPoolExecutor(max_workers=self.num_workers, mp_context=self.mp_context) as executor:
+                for df_chunk in self._read_chunks(conn):
+                    # Chunks are yielded in submission order, so the output matches the serial path
+                    future = executor.submit(_extract_batch, self, df_chunk["content"].tolist())
+                    pending.append((df_chunk, future))
+                    if len(pending) >= self.max_inflight:
+                        yield drain_one()
+
+                while pending:
+                    yield drain_one()
+
+        finally:
+            conn.close()
+
+        for pid, (rows, busy) in sorted(worker_stats.items()):
+            rate = rows / busy if busy else 0.0
+            print(f"📊 Worker {pid}: {rows} rows at {rate:.1f} rows/sec")
+        self.print_decode_stats()
+
+    def extract_subtitles(self):
+        """Writes the extracted chunks to output_parquet and returns the number of rows written.
+
+        With a manifest, the output is written as part files of checkpoint_chunks chunks
+        each, and the extract checkpoint advances as each part is closed. A run resumed
+        with start_num keeps the parts written before the checkpoint. The parts are joined
+        into output_parquet at the end. Resumed rows are included in the returned count.
+        """
+        if self.manifest is None:
+            return self._write_chunks(self.iter_subtitle_chunks(), self.output_parquet)
+
+        parts_dir = self.output_parquet + ".parts"
+        os.makedirs(parts_dir, exist_ok=True)
+        # Parts are named by their last num; those past the checkpoint were never committed
+        for path in glob.glob(os.path.join(parts_dir, "*")):
+            name = os.path.basename(path)
+            if not self.start_num or not name.endswith(".parquet") or int(name[5:-8]) > self.start_num:
+                os.remove(path)
+
+        rows = 0
+        chunks = self.iter_subtitle_chunks()
+        while True:
+            part = []
+            for df_chunk in chunks:
+                part.append(df_chunk)
+                if len(part) == self.checkpoint_chunks:
                     break
+            if not part:
+                break
+            last_num = int(part[-1]["num"].max())
+            temp_path = os.path.join(parts_dir, "part.tmp")
+            rows += self._write_chunks(part, temp_path)
+            os.replace(temp_path, os.path.join(parts_dir, f"part-{last_num:012d}.parquet"))
+            self.manifest.commit("extract", last_num)
+
+        parts = sorted(glob.glob(os.path.join(parts_dir, "part-*.parquet")))
+        resumed = sum(pq.ParquetFile(path).metadata.num_rows for path in parts) - rows
+        if resumed:
+            print(f"⏩ Kept {resumed} rows extracted before num {self.start_num}.")
+        if parts:
+            self._join_parts(parts, self.output_parquet)
+        for path in parts:
+            os.remove(path)
+        os.rmdir(parts_dir)
+        return rows + resumed
 
-                df_chunk["subtitles"] = df_chunk["content"].apply(self.extract_full_subtitle)
-                df_chunk.drop(columns=["content"], inplace=True)
+    def _write_chunks(self, chunks, path):
+        writer = None
+        rows = 0
 
+        try:
+            for df_chunk in chunks:
                 table = pa.Table.from_pandas(df_chunk)
 
                 if writer is None:
-                    writer = pq.ParquetWriter(self.output_parquet, table.schema)
+                    writer = pq.ParquetWriter(path, table.schema)
                 writer.write_table(table)
+                rows += len(df_chunk)
+
+                print(f"✅ Processed up to num {df_chunk['num'].max()}.")
 
-                last_num = df_chunk["num"].max()
-                print(f"✅ Processed up to num {last_num}.")
+        finally:
+            if writer:
+                writer.close()
 
+        return rows
+
+    @staticmethod
+    def _join_parts(parts, path):
+        """Copies the part files' row groups, in order, into one Parquet file."""
+        writer = None
+        try:
+            for part in parts:
+                part_file = pq.ParquetFile(part)
+                for i in range(part_file.num_row_groups):
+                    table = part_file.read_row_group(i)
+                    if writer is None:
+                        writer = pq.ParquetWriter(path, table.schema)
+                    writer.write_table(table)
         finally:
             if writer:
                 writer.close()
-        conn.close()
@@ -1,36 +1,169 @@
+import os
+import sys
 from Data_Extractor import DataExtractor
 from Data_Cleaner import DataCleaner
 from Vectordb import SubtitleVectorDB
+from Data_Streaming import StreamingPipeline
+from Data_Checkpoint import IngestManifest
+from Data_Chunker import SubtitleChunker
+from Data_Dedup import SubtitleDeduplicator
+from bm25_index import BM25IndexBuilder
+
+MANIFEST_PATH = "./ingest_manifest.db"
+# MinHash signatures of indexed subtitles, so later runs fold new releases into them
+DEDUP_INDEX_PATH = "./dedup_index.db"
+LEXICAL_INDEX_DIR = "./lexical_index"
+# "chroma", or "numpy" for the memory-mapped store in vector_store.py (VECTOR_QUANTIZE=1 stores
+# int8 vectors, VECTOR_IVF_LISTS=N builds N inverted lists for sub-linear search)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_DB_PATH = "./chroma_db" if VECTOR_BACKEND == "chroma" else "./numpy_store"
+STORE_OPTIONS = {} if VECTOR_BACKEND == "chroma" else {
+    "quantize": os.getenv("VECTOR_QUANTIZE") == "1",
+    "nlist": int(os.getenv("VECTOR_IVF_LISTS", "0")) or None,
+}
+# "torch", or "onnx" to encode with the int8-quantized model on ONNX Runtime (see onnx_encoder.py)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
 
 def data_preprocessing_pipeline():
     print("🚀 Starting the subtitle processing pipeline...")
 
-    # Step 1: Extract subtitles from the database
-    extractor = DataExtractor(
-        db_path=r"E:\Project\Innomatics\Sub_Search\Dataset\eng_subtitles_database.db",
-        output_parquet=r"E:\Project\Innomatics\Sub_Search\subtitles_full.parquet"
-    )
-    extractor.extract_subtitles()
-    print("✅ Subtitle extraction completed.")
+    # Stage checkpoints let a rerun pick up after a crash; row hashes make later runs incremental
+    manifest = IngestManifest(MANIFEST_PATH)
+
+    # Step 1: Extract new or changed subtitles from the database
+    if manifest.is_complete("extract"):
+        print("⏩ Subtitle extraction already completed in this run.")
+    else:
+        # Extraction commits its checkpoint as it goes, so an interrupted run resumes after it
+        resume_from = manifest.last_num("extract")
+        if resume_from:
+            print(f"⏩ Resuming subtitle extraction after num {resume_from}.")
+        extractor = DataExtractor(
+            db_path=r"E:\Project\Innomatics\Sub_Search\Dataset\eng_subtitles_database.db",
+            output_parquet=r"E:\Project\Innomatics\Sub_Search\subtitles_full.parquet",
+            num_workers=os.cpu_count() or 1,
+            manifest=manifest,
+            start_num=resume_from
+        )
+        if extractor.extract_subtitles() == 0:
+            print("🎯 No new or changed subtitles to process.")
+            manifest.finish_run()
+            return
+        manifest.commit("extract", extractor.last_num, complete=True)
+        print("✅ Subtitle extraction completed.")
 
     # Step 2: Clean subtitles
-    cleaner = DataCleaner(
-        input_parquet=r"E:\Project\Innomatics\Sub_Search\subtitles_full.parquet",
-        output_parquet=r"E:\Project\Innomatics\Sub_Search\cleaned_subtitles.parquet"
-    )
-    cleaner.clean_subtitles()
-    print("✅ Subtitle cleaning completed.")
+    if manifest.is_complete("clean"):
+        print("⏩ Subtitle cleaning already completed in this run.")
+    else:
+        cleaner = DataCleaner(
+            input_parquet=r"E:\Project\Innomatics\Sub_Search\subtitles_full.parquet",
+            output_parquet=r"E:\Project\Innomatics\Sub_Search\cleaned_subtitles.parquet",
+            num_workers=os.cpu_count() or 1,
+            keep_timestamps=True
+        )
+        cleaner.clean_subtitles()
+        manifest.commit("clean", manifest.last_num("extract"), complete=True)
+        print("✅ Subtitle cleaning completed.")
 
-    # Step 3: Store cleaned subtitles in a vector database
-    vector_db = SubtitleVectorDB(
-        db_path="./chroma_db",
-        parquet_file=r"E:\Project\Innomatics\Sub_Search\cleaned_subtitles.parquet"
-    )
-    vector_db.load_data()
-    print("✅ Subtitle vector database creation completed.")
+    # Step 3: Fold near-duplicate releases of the same title into one canonical row
+    if manifest.is_complete("dedup"):
+        print("⏩ Near-duplicate detection already completed in this run.")
+    else:
+        deduplicator = SubtitleDeduplicator(
+            input_parquet=r"E:\Project\Innomatics\Sub_Search\cleaned_subtitles.parquet",
+            output_parquet=r"E:\Project\Innomatics\Sub_Search\deduplicated_subtitles.parquet",
+            num_workers=os.cpu_count() or 1,
+            index_path=DEDUP_INDEX_PATH,
+            manifest=manifest
+        )
+        deduplicator.deduplicate()
+        manifest.commit("dedup", manifest.last_num("extract"), complete=True)
+        print("✅ Near-duplicate detection completed.")
+
+    # Step 4: Store time-windowed chunks of the cleaned subtitles in a vector database
+    if manifest.is_complete("index"):
+        print("⏩ Vector database creation already completed in this run.")
+    else:
+        vector_db = SubtitleVectorDB(
+            db_path=VECTOR_DB_PATH,
+            backend=VECTOR_BACKEND,
+            store_options=STORE_OPTIONS,
+            encoder_backend=ENCODER_BACKEND,
+            parquet_file=r"E:\Project\Innomatics\Sub_Search\deduplicated_subtitles.parquet",
+            manifest=manifest,
+            chunker=SubtitleChunker()
+        )
+        vector_db.load_data()
+        manifest.commit("index", manifest.last_num("index"), complete=True)
+        print("✅ Subtitle vector database creation completed.")
+
+    # Step 5: Add the same chunks to a new segment of the BM25 index used by hybrid search
+    BM25IndexBuilder(
+        parquet_file=r"E:\Project\Innomatics\Sub_Search\deduplicated_subtitles.parquet",
+        index_dir=LEXICAL_INDEX_DIR,
+        chunker=SubtitleChunker()
+    ).build()
+    manifest.finish_run()
+    print("✅ Lexical index creation completed.")
 
     print("🎯 Processing pipeline executed successfully!")
 
+def streaming_preprocessing_pipeline(write_intermediate=False):
+    print("🚀 Starting the streaming subtitle processing pipeline...")
+
+    # Only the index stage commits while streaming, so a rerun resumes after its checkpoint
+    manifest = IngestManifest(MANIFEST_PATH)
+
+    # Extract, clean and index run concurrently; intermediate Parquet files are optional taps
+    pipeline = StreamingPipeline(
+        extractor=DataExtractor(
+            db_path=r"E:\Project\Innomatics\Sub_Search\Dataset\eng_subtitles_database.db",
+            output_parquet=None,
+            num_workers=os.cpu_count() or 1,
+            manifest=manifest,
+            start_num=manifest.last_num("index")
+        ),
+        cleaner=DataCleaner(
+            input_parquet=None,
+            output_parquet=None,
+            num_workers=os.cpu_count() or 1,
+            keep_timestamps=True
+        ),
+        vector_db=SubtitleVectorDB(
+            db_path=VECTOR_DB_PATH,
+            parquet_file=None,
+            manifest=manifest,
+            chunker=SubtitleChunker(),
+            backend=VECTOR_BACKEND,
+            store_options=STORE_OPTIONS,
+            encoder_backend=ENCODER_BACKEND
+        ),
+        extracted_parquet=r"E:\Project\Innomatics\Sub_Search\subtitles_full.parquet" if write_intermediate else None,
+        cleaned_parquet=r"E:\Project\Innomatics\Sub_Search\cleaned_subtitles.parquet" if write_intermediate else None,
+        deduplicator=SubtitleDeduplicator(
+            input_parquet=None,
+            output_parquet=None,
+            index_path=DEDUP_INDEX_PATH,
+            manifest=manifest
+        )
+    )
+    pipeline.run()
+
+    # The lexical index is built from a file, so it needs the cleaned Parquet tap
+    if write_intermediate:
+        BM25IndexBuilder(
+            parquet_file=r"E:\Project\Innomatics\Sub_Search\cleaned_subtitles.parquet",
+            index_dir=LEXICAL_INDEX_DIR,
+            chunker=SubtitleChunker()
+        ).build()
+    manifest.finish_run()
+
+    print("🎯 Streaming pipeline executed successfully!")
+
 if __name__ == "__main__":
-    data_preprocessing_pipeline()
+    if "--stream" in sys.argv:
+        streaming_preprocessing_pipeline(write_intermediate="--write-parquet" in sys.argv)
+    else:
+        data_preprocessing_pipeline()
 
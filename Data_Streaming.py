@@ -0,0 +1,148 @@
+import multiprocessing
+import queue
+import threading
+import time
+import pyarrow.parquet as pq
+from Data_Cleaner import frame_to_table
+
+_DONE = object()
+
+
+class _StageFailed(Exception):
+    """Raised in a downstream stage when an upstream stage has stopped with an error."""
+
+
+class ParquetTap:
+    """Writes every DataFrame that passes through a stage to a Parquet file."""
+
+    def __init__(self, output_parquet):
+        self.output_parquet = output_parquet
+        self.writer = None
+
+    def write(self, df_chunk):
+        table = frame_to_table(df_chunk)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.output_parquet, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+            print(f"✅ Tap saved to: {self.output_parquet}")
+
+
+class StreamingPipeline:
+    """Runs extract, clean and embed/insert as concurrent stages joined by bounded queues.
+
+    Extraction and cleaning each run in their own thread (and fan out to their process
+    pools when configured with num_workers > 1), while the calling thread encodes and
+    writes to Chroma, so cleaning overlaps with embedding. Nothing touches disk between
+    stages unless a Parquet tap is given for the extracted or cleaned chunks. With a
+    deduplicator, the clean stage also folds near-duplicates (see
+    SubtitleDeduplicator.deduplicate_frames) before chunks reach the tap and the index.
+
+    The stage pools are started from worker threads after the encoder (and torch) has
+    loaded, where forking is unsafe, so an extractor or cleaner without an mp_context
+    gets the "spawn" context.
+    """
+
+    def __init__(self, extractor, cleaner, vector_db, queue_size=4, extracted_parquet=None, cleaned_parquet=None,
+                 deduplicator=None):
+        self.extractor = extractor
+        self.cleaner = cleaner
+        self.deduplicator = deduplicator
+        self.vector_db = vector_db
+        for stage in (extractor, cleaner):
+            if stage.mp_context is None:
+                stage.mp_context = multiprocessing.get_context("spawn")
+        self.queue_size = queue_size
+        self.extracted_tap = ParquetTap(extracted_parquet) if extracted_parquet else None
+        self.cleaned_tap = ParquetTap(cleaned_parquet) if cleaned_parquet else None
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _put(self, out_queue, item):
+        # Give up when a later stage has failed instead of blocking on a full queue forever
+        while not self._stop.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self, in_queue):
+        while True:
+            if self._stop.is_set():
+                raise _StageFailed()
+            try:
+                item = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _run_stage(self, chunks, tap, out_queue):
+        try:
+            for df_chunk in chunks:
+                if tap:
+                    tap.write(df_chunk)
+                if not self._put(out_queue, df_chunk):
+                    break
+        except _StageFailed:
+            pass
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            chunks.close()
+            if tap:
+                tap.close()
+            self._put(out_queue, _DONE)
+
+    def run(self):
+        extracted = queue.Queue(maxsize=self.queue_size)
+        cleaned = queue.Queue(maxsize=self.queue_size)
+        cleaned_frames = self.cleaner.clean_frames(self._drain(extracted))
+        if self.deduplicator is not None:
+            cleaned_frames = self.deduplicator.deduplicate_frames(cleaned_frames)
+
+        stages = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(self.extractor.iter_subtitle_chunks(), self.extracted_tap, extracted),
+                name="extract",
+            ),
+            threading.Thread(
+                target=self._run_stage,
+                args=(cleaned_frames, self.cleaned_tap, cleaned),
+                name="clean",
+            ),
+        ]
+        for stage in stages:
+            stage.start()
+
+        start = time.perf_counter()
+        rows = 0
+        try:
+            for batch_count, df_chunk in enumerate(self._drain(cleaned)):
+                records = self.vector_db.index_frame(df_chunk)
+                rows += len(df_chunk)
+                print(f"✅ Indexed batch {batch_count + 1} with {records} records "
+                      f"({rows / (time.perf_counter() - start):.1f} rows/sec)")
+        except _StageFailed:
+            pass
+        except Exception as e:
+            self._errors.append(e)
+        finally:
+            # Stages poll this flag while waiting on a queue, so they exit promptly
+            self._stop.set()
+            for stage in stages:
+                stage.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        self.vector_db.finish()
+        print(f"🚀 Streamed {rows} subtitles into the vector database.")
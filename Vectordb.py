@@ -1,50 +1,192 @@
-import chromadb
-import dask.dataframe as dd
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
 import torch
-from sentence_transformers import SentenceTransformer
+from embedding_cache import EmbeddingCache
+from model_registry import load_encoder
+from vector_store import open_store
+
+def encode_length_bucketed(texts, encode_fn, batch_size=64):
+    """Encodes texts in batches of similar length, so little of each batch is padding.
+
+    Returns float32 vectors in the original order of texts.
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    vectors = None
+    for i in range(0, len(order), batch_size):
+        bucket = order[i:i + batch_size]
+        encoded = np.asarray(encode_fn([texts[j] for j in bucket]), dtype=np.float32)
+        if vectors is None:
+            vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        vectors[bucket] = encoded
+    return vectors if vectors is not None else np.empty((0, 0), dtype=np.float32)
 
 class SubtitleVectorDB:
-    def __init__(self, db_path, parquet_file, model_name="all-MiniLM-L6-v2", batch_size=1000, overlap=100):
+    def __init__(self, db_path, parquet_file, model_name="all-MiniLM-L6-v2", batch_size=1000, overlap=100, manifest=None,
+                 cache_dir="./embedding_cache", chunker=None, encode_batch_size=64, backend="chroma", store_options=None,
+                 encoder_backend="torch"):
         self.db_path = db_path
         self.parquet_file = parquet_file
         self.batch_size = batch_size
-        self.overlap = overlap  # Overlapping chunk size
+        # Rows of the previous batch upserted again with the next one. Chunks are already
+        # time windows that overlap, so a chunked load does not repeat any rows.
+        self.overlap = 0 if chunker is not None else overlap
+        self.manifest = manifest  # Optional IngestManifest for resumable, incremental loads
+        self.chunker = chunker  # Optional SubtitleChunker: index time-windowed chunks instead of whole files
+        self.encode_batch_size = encode_batch_size
+        self._replaces_rows = None  # Whether batches may hold rows the store already has; set on the first batch
         
-        # Load embedding model
+        # Load embedding model: a SentenceTransformer, or the int8 ONNX Runtime encoder on CPU-only nodes
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = SentenceTransformer(model_name, device=self.device)
+        self.model = load_encoder(model_name, encoder_backend, device=self.device)
+        # Vectors keyed by (model, text hash) survive rebuilds; pass cache_dir=None to disable.
+        # int8 vectors differ slightly from the PyTorch ones, so each backend has its own cache.
+        cache_name = model_name if encoder_backend == "torch" else f"{model_name}-{encoder_backend}"
+        self.embedding_cache = EmbeddingCache(cache_dir, cache_name) if cache_dir else None
         
-        # Initialize ChromaDB client
-        self.chroma_client = chromadb.PersistentClient(path=self.db_path)
-        self.collection = self.chroma_client.get_or_create_collection(name="subtitles_collection")
+        # Chroma, or the memory-mapped NumPy store (see vector_store.py)
+        self.store = open_store(backend, self.db_path, **(store_options or {}))
     
+    def _encode_model(self, texts):
+        return encode_length_bucketed(
+            texts,
+            lambda bucket: self.model.encode(bucket, batch_size=len(bucket), convert_to_numpy=True),
+            self.encode_batch_size
+        )
+
+    def encode(self, texts):
+        """Encodes texts, reusing cached vectors when an embedding cache is configured."""
+        if self.embedding_cache is None:
+            return self._encode_model(texts)
+        return self.embedding_cache.encode(texts, self._encode_model)
+
+    def replaces_rows(self):
+        """Whether stored entries of incoming rows must be deleted before they are written again.
+
+        Without a manifest a load is a fresh build, and a store that was empty at the first
+        batch only holds rows of this load, so neither has stale entries to delete.
+        """
+        if self._replaces_rows is None:
+            self._replaces_rows = self.manifest is not None and self.store.count() > 0
+        return self._replaces_rows
+
+    def prepare_batch(self, batch_df):
+        """Drops stale entries for the batch and splits it into chunks when a chunker is configured."""
+        if not self.replaces_rows():
+            return batch_df if self.chunker is None else self.chunker.chunk_frame(batch_df)
+
+        # Near-duplicates folded into a canonical row may have been indexed on their own before
+        stale = [int(num) for nums in batch_df["alt_nums"] for num in nums] if "alt_nums" in batch_df.columns else []
+
+        if self.chunker is None:
+            if stale:
+                self.store.delete(ids=[str(num) for num in stale])
+            return batch_df
+
+        # A re-indexed subtitle may now have fewer chunks, so drop whatever it had before
+        self.store.delete(nums=[int(num) for num in batch_df["num"].unique()] + stale)
+        return self.chunker.chunk_frame(batch_df)
+
+    def index_frame(self, batch_df):
+        """Chunks (if configured), encodes and upserts a DataFrame of cleaned subtitles."""
+        batch_df = self.prepare_batch(batch_df)
+        if not batch_df.empty:
+            self.add_batch(batch_df)
+        return len(batch_df)
+
+    def add_batch(self, batch_df, embeddings=None):
+        """Encodes a DataFrame of cleaned subtitles and upserts it into the vector store.
+
+        Rows are keyed by num, or by their id for chunked rows, so writing rows that are
+        already stored replaces them instead of failing on duplicate ids. Pass embeddings
+        to skip the encoder for rows whose vectors are already known.
+        """
+        if embeddings is None:
+            embeddings = self.encode(batch_df["subtitles"].tolist())
+
+        if "id" in batch_df.columns:
+            ids = batch_df["id"].tolist()
+            metadatas = [
+                {"name": name, "num": int(num), "chunk": int(chunk), "start": float(start), "end": float(end)}
+                for name, num, chunk, start, end in zip(batch_df["name"], batch_df["num"], batch_df["chunk"], batch_df["start"], batch_df["end"])
+            ]
+        else:
+            ids = batch_df["num"].astype(str).tolist()
+            metadatas = [{"name": name, "num": int(num)} for name, num in zip(batch_df["name"], batch_df["num"])]
+
+        if "alt_nums" in batch_df.columns:
+            # Chroma metadata values are scalars, so alternates are stored as joined strings
+            for metadata, alt_nums, alt_names in zip(metadatas, batch_df["alt_nums"], batch_df["alt_names"]):
+                if len(alt_nums):
+                    metadata["alt_nums"] = ",".join(str(int(num)) for num in alt_nums)
+                    metadata["alt_names"] = "|".join(alt_names)
+
+        self.store.upsert(ids, embeddings, metadatas, batch_df["subtitles"].tolist())
+        # Lets running search apps notice the write and drop cached results
+        self.store.mark_updated()
+
+        if self.manifest is not None:
+            nums = batch_df["num"].tolist()
+            hashes = batch_df["content_hash"].tolist() if "content_hash" in batch_df.columns else None
+            if "alt_nums" in batch_df.columns:
+                # Folded duplicates count as indexed, so later runs do not extract them again
+                nums += [num for alt_nums in batch_df["alt_nums"] for num in alt_nums]
+                if hashes is not None:
+                    hashes += [digest for alt_hashes in batch_df["alt_hashes"] for digest in alt_hashes]
+            self.manifest.commit_rows("index", nums, hashes, last_num=int(batch_df["num"].max()))
+
+        return embeddings
+
+    def finish(self):
+        """Reports cache statistics and lets the vector store reorganize after a load."""
+        if self.embedding_cache is not None:
+            self.embedding_cache.print_stats()
+        self.store.optimize()
+
     def load_data(self):
-        """Loads and processes the Parquet file into ChromaDB with overlapping chunks."""
-        # Read Parquet file using Dask
-        dask_df = dd.read_parquet(self.parquet_file, blocksize="500MB")
-        pandas_df = dask_df.compute()
-
-        # Process data with overlap
-        batches = []
-        num_rows = len(pandas_df)
-        for i in range(0, num_rows, self.batch_size):
-            start_idx = max(0, i - self.overlap)
-            end_idx = min(num_rows, i + self.batch_size)
-            batch = pandas_df.iloc[start_idx:end_idx]
-            batches.append(batch)
-
-        for batch_count, batch_df in enumerate(batches):
-            batch_data = {
-                "ids": batch_df["num"].astype(str).tolist(),
-                "documents": batch_df["subtitles"].tolist(),
-                "metadatas": [{"name": name} for name in batch_df["name"]],
-                "embeddings": self.model.encode(batch_df["subtitles"].tolist(), convert_to_numpy=True).tolist()
-            }
-            
-            self.collection.add(**batch_data)
-            print(f"✅ Processed batch {batch_count + 1} with {len(batch_df)} records (including overlap).")
-        
-        print("🚀 ChromaDB vector database created successfully!")
+        """Streams the Parquet file into the vector store one record batch at a time.
+
+        Without a chunker, the last overlap rows of each batch are upserted again with the next.
+        """
+        parquet_file = pq.ParquetFile(self.parquet_file)
+        tail_df, tail_embeddings = None, None
+
+        # Rows up to the last committed num were indexed before an earlier run stopped
+        resume_from = self.manifest.last_num("index") if self.manifest is not None else 0
+        if resume_from:
+            print(f"⏩ Resuming after num {resume_from}.")
+
+        wanted = ["num", "name", "subtitles", "content_hash", "cue_start", "cue_end", "alt_nums", "alt_names", "alt_hashes"]
+        columns = [name for name in wanted if name in parquet_file.schema_arrow.names]
+        batches = parquet_file.iter_batches(batch_size=self.batch_size, columns=columns)
+        for batch_count, batch in enumerate(batches):
+            batch_df = batch.to_pandas()
+            if resume_from:
+                batch_df = batch_df[batch_df["num"] > resume_from].reset_index(drop=True)
+                if batch_df.empty:
+                    continue
+
+            batch_df = self.prepare_batch(batch_df)
+            if batch_df.empty:
+                continue
+            embeddings = self.encode(batch_df["subtitles"].tolist())
+
+            upsert_df, upsert_embeddings = batch_df, embeddings
+            if tail_df is not None:
+                # Overlap rows reuse the vectors from the previous batch and upsert idempotently
+                upsert_df = pd.concat([tail_df, batch_df], ignore_index=True)
+                upsert_embeddings = np.vstack([tail_embeddings, embeddings])
+
+            self.add_batch(upsert_df, upsert_embeddings)
+            repeated = f" (+{len(tail_df)} overlap)" if tail_df is not None else ""
+            unit = "chunks" if self.chunker is not None else "records"
+            print(f"✅ Processed batch {batch_count + 1} with {len(batch_df)} {unit}{repeated}.")
+
+            if self.overlap:
+                tail_df, tail_embeddings = batch_df.iloc[-self.overlap:], embeddings[-self.overlap:]
+
+        self.finish()
+        print("🚀 Vector database created successfully!")
 
 if __name__ == "__main__":
     db_loader = SubtitleVectorDB(db_path="./chroma_db", parquet_file=r"E:\Project\Innomatics\Sub_Search\cleaned_subtitles.parquet")
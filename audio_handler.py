@@ -1,49 +1,194 @@
+import io
 import os
-import torch
+import time
+import numpy as np
 import soundfile as sf
 from datetime import datetime
-from transformers import pipeline
+from math import gcd
+from model_registry import get_asr_pipeline
+
+TARGET_SAMPLE_RATE = 16_000  # What Whisper's feature extractor expects
+
+
+def decode_audio(audio_bytes):
+    """Decodes a WAV/FLAC/OGG buffer in memory into a mono float32 waveform and its sample rate."""
+    waveform, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    return (waveform[:, 0] if waveform.shape[1] == 1 else waveform.mean(axis=1)), sample_rate
+
+
+def resample(waveform, sample_rate, target_rate=TARGET_SAMPLE_RATE):
+    """Resamples with a polyphase filter, once, to target_rate."""
+    if sample_rate == target_rate:
+        return waveform
+    from scipy.signal import resample_poly
+    divisor = gcd(sample_rate, target_rate)
+    return resample_poly(waveform, target_rate // divisor, sample_rate // divisor).astype(np.float32)
+
+
+def voiced_spans(waveform, sample_rate, frame_ms=30, margin_db=12, floor_db=-50, min_gap_ms=400, pad_ms=150):
+    """Finds the (start, end) sample ranges that hold speech, with a frame energy detector.
+
+    A frame is voiced when its RMS level is margin_db above the noise floor and above
+    floor_db. The noise floor is the 10th percentile of frame levels, but at least
+    2 * margin_db below the loudest frame, for recordings that are nearly all speech.
+    Voiced runs separated by less than min_gap_ms are merged, and each span is padded
+    by pad_ms on both sides.
+    """
+    frame = max(1, sample_rate * frame_ms // 1000)
+    frames = len(waveform) // frame
+    if frames == 0:
+        return []
+
+    energy = np.sqrt(np.mean(waveform[:frames * frame].reshape(frames, frame) ** 2, axis=1))
+    levels = 20 * np.log10(np.maximum(energy, 1e-10))
+    noise = min(np.percentile(levels, 10), levels.max() - 2 * margin_db)
+    voiced = levels > max(noise + margin_db, floor_db)
+
+    # Rising and falling edges of the voiced mask give the runs
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]])))
+    runs = edges.reshape(-1, 2)
+    spans = []
+    max_gap = min_gap_ms // frame_ms
+    for start, end in runs:
+        if spans and start - spans[-1][1] <= max_gap:
+            spans[-1][1] = end
+        else:
+            spans.append([start, end])
+
+    pad = sample_rate * pad_ms // 1000
+    return [(max(0, start * frame - pad), min(len(waveform), end * frame + pad)) for start, end in spans]
+
+
+def chunk_spans(spans, sample_rate, chunk_seconds=30, overlap_seconds=2):
+    """Packs voiced spans into chunks of at most chunk_seconds.
+
+    Consecutive spans share a chunk while they fit, so chunks are cut at pauses and the
+    silence around them is dropped. A span longer than a chunk is split into windows
+    that overlap by overlap_seconds; such chunks are marked so their transcripts can be
+    stitched together. Returns (start, end, overlaps_previous) tuples.
+    """
+    size = int(chunk_seconds * sample_rate)
+    step = size - int(overlap_seconds * sample_rate)
+    chunks = []
+    for start, end in spans:
+        if end - start > size:
+            for i, window_start in enumerate(range(start, end - size + step, step)):
+                chunks.append((window_start, min(window_start + size, end), i > 0))
+        elif chunks and not chunks[-1][2] and end - chunks[-1][0] <= size:
+            chunks[-1] = (chunks[-1][0], end, False)
+        else:
+            chunks.append((start, end, False))
+    return chunks
+
+
+def merge_overlap(previous, text, max_words=20):
+    """Appends text to previous, dropping the words that repeat the end of previous."""
+    before, after = previous.split(), text.split()
+    normalize = lambda words: [word.strip(".,!?;:").lower() for word in words]
+    tail, head = normalize(before[-max_words:]), normalize(after[:max_words])
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return " ".join(before + after[size:])
+    return " ".join(before + after)
+
 
 class AudioProcessor:
-    """Handles audio saving and transcription using Whisper ASR."""
+    """Transcribes recorded audio with Whisper ASR, in memory and in batches.
 
-    def __init__(self, save_dir="recordings"):
+    Recordings are decoded from their bytes and resampled to 16 kHz once. Silence is
+    trimmed with an energy detector, and the speech is packed into chunks of at most 30
+    seconds (Whisper's window) that go through the pipeline in batches of batch_size.
+    Recordings are only written to disk when save_dir is set.
+    """
+
+    def __init__(self, save_dir=None, batch_size=8, chunk_seconds=30, overlap_seconds=2):
         self.save_dir = save_dir
-        os.makedirs(save_dir, exist_ok=True)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.asr_pipeline = pipeline(
-            "automatic-speech-recognition",
-            model="openai/whisper-small",
-            device=0 if torch.cuda.is_available() else -1,
-            generate_kwargs={"language": "en"}
-        )
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+        self.batch_size = batch_size
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
 
-    def save_audio(self, audio_file):
-        """Saves the recorded or uploaded audio file and returns the file path."""
+    @property
+    def asr_pipeline(self):
+        # Whisper is loaded once per process, the first time audio is transcribed
+        return get_asr_pipeline()
 
+    @staticmethod
+    def read_bytes(audio_file):
+        if isinstance(audio_file, (bytes, bytearray)):
+            return bytes(audio_file)
+        if hasattr(audio_file, "getvalue"):
+            return audio_file.getvalue()
         if hasattr(audio_file, "read"):
-            audio_bytes = audio_file.read()
-        else:
-            raise ValueError("Invalid audio input. Expected a file-like object.")
+            return audio_file.read()
+        raise ValueError("Invalid audio input. Expected bytes or a file-like object.")
+
+    def save_audio(self, audio_file):
+        """Saves the recorded or uploaded audio file and returns the file path."""
+        if not self.save_dir:
+            raise ValueError("No save_dir configured for recordings.")
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"recording_{timestamp}.wav"
         file_path = os.path.join(self.save_dir, filename)
 
         with open(file_path, "wb") as f:
-            f.write(audio_bytes)
+            f.write(self.read_bytes(audio_file))
 
         return file_path
 
-    def transcribe_audio(self, wav_path):
-        """Converts audio file to text using Whisper ASR."""
-        waveform, sample_rate = sf.read(wav_path)
+    def prepare_chunks(self, audio_bytes):
+        """Decodes, resamples and splits a recording; returns (chunks, audio seconds, voiced seconds)."""
+        waveform, sample_rate = decode_audio(audio_bytes)
+        waveform = resample(waveform, sample_rate)
+        spans = voiced_spans(waveform, TARGET_SAMPLE_RATE)
+        chunks = [
+            (waveform[start:end], overlaps)
+            for start, end, overlaps in chunk_spans(spans, TARGET_SAMPLE_RATE, self.chunk_seconds, self.overlap_seconds)
+        ]
+        voiced = sum(int(end - start) for start, end in spans) / TARGET_SAMPLE_RATE
+        return chunks, len(waveform) / TARGET_SAMPLE_RATE, voiced
+
+    def transcribe(self, audio_file):
+        """Transcribes a recording (bytes, a file-like object or a path) and reports its real-time factor.
+
+        Returns a dict with the text, the audio and voiced durations in seconds, the
+        number of chunks, the processing time and rtf (processing time / audio duration).
+        """
+        start = time.perf_counter()
+        if isinstance(audio_file, (str, os.PathLike)):
+            with open(audio_file, "rb") as f:
+                audio_bytes = f.read()
+        else:
+            audio_bytes = self.read_bytes(audio_file)
+            if self.save_dir:
+                self.save_audio(audio_bytes)
 
-        waveform = torch.tensor(waveform, dtype=torch.float32).to(self.device)
+        chunks, audio_seconds, voiced_seconds = self.prepare_chunks(audio_bytes)
+        text = ""
+        if chunks:
+            outputs = self.asr_pipeline(
+                [{"raw": chunk, "sampling_rate": TARGET_SAMPLE_RATE} for chunk, _ in chunks],
+                batch_size=self.batch_size
+            )
+            for (_, overlaps), output in zip(chunks, outputs):
+                piece = output["text"].strip()
+                text = merge_overlap(text, piece) if overlaps else " ".join(filter(None, [text, piece]))
 
-        result = self.asr_pipeline({
-            "array": waveform.squeeze().cpu().numpy(),
-            "sampling_rate": sample_rate
-        })
+        elapsed = time.perf_counter() - start
+        rtf = elapsed / audio_seconds if audio_seconds else 0.0
+        print(f"🎙️ Transcribed {audio_seconds:.1f}s of audio ({voiced_seconds:.1f}s voiced, {len(chunks)} chunks) "
+              f"in {elapsed:.2f}s, RTF {rtf:.3f}")
+        return {
+            "text": text,
+            "audio_seconds": audio_seconds,
+            "voiced_seconds": voiced_seconds,
+            "chunks": len(chunks),
+            "seconds": elapsed,
+            "rtf": rtf,
+        }
 
-        return result['text']
+    def transcribe_audio(self, audio_file):
+        """Converts audio (bytes, a file-like object or a path) to text using Whisper ASR."""
+        return self.transcribe(audio_file)["text"]
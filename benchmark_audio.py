@@ -0,0 +1,88 @@
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import soundfile as sf
+from audio_handler import AudioProcessor, chunk_spans, decode_audio, resample, voiced_spans, TARGET_SAMPLE_RATE
+
+
+def sample_recording(seconds, sample_rate=48_000, seed=0):
+    """Builds a WAV recording of speech-like bursts (modulated tones) separated by pauses, over low noise."""
+    rng = np.random.default_rng(seed)
+    parts, total = [], 0.0
+    while total < seconds:
+        length = min(rng.uniform(0.3, 1.5) if len(parts) % 2 == 0 else rng.uniform(2, 12), seconds - total)
+        t = np.arange(int(length * sample_rate)) / sample_rate
+        if len(parts) % 2:
+            parts.append(0.3 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) * (1 + 0.5 * np.sin(2 * np.pi * 4 * t)))
+        else:
+            parts.append(np.zeros_like(t))
+        total += length
+    waveform = np.concatenate(parts) + 0.003 * rng.normal(size=sum(len(part) for part in parts))
+    buffer = io.BytesIO()
+    sf.write(buffer, waveform.astype(np.float32), sample_rate, format="WAV")
+    return buffer.getvalue()
+
+
+def old_prepare(audio_bytes, work_dir):
+    """The previous path: write the recording to disk and read the whole clip back at its own rate."""
+    path = os.path.join(work_dir, "recording.wav")
+    with open(path, "wb") as f:
+        f.write(audio_bytes)
+    return sf.read(path)
+
+
+def new_prepare(audio_bytes):
+    waveform, sample_rate = decode_audio(audio_bytes)
+    waveform = resample(waveform, sample_rate)
+    spans = voiced_spans(waveform, TARGET_SAMPLE_RATE)
+    return chunk_spans(spans, TARGET_SAMPLE_RATE), sum(int(end - start) for start, end in spans) / TARGET_SAMPLE_RATE
+
+
+def best_of(fn, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Audio preparation cost and end-to-end real-time factor of transcription.")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60, 300], help="Recording lengths to test")
+    parser.add_argument("--asr", action="store_true", help="Also run Whisper (downloads the model on first use)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 8], help="ASR batch sizes to try with --asr")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for seconds in args.seconds:
+            audio_bytes = sample_recording(seconds)
+            old_time, _ = best_of(lambda: old_prepare(audio_bytes, work_dir))
+            new_time, (chunks, voiced) = best_of(lambda: new_prepare(audio_bytes))
+            # The old path left resampling to the pipeline, so its time here is only disk I/O and decoding
+            print(f"📊 {seconds:6.0f}s recording: disk round trip {old_time * 1000:7.1f} ms, "
+                  f"in-memory decode + 16 kHz resample + VAD {new_time * 1000:7.1f} ms (RTF {new_time / seconds:.4f}); "
+                  f"{voiced:.1f}s voiced in {len(chunks)} chunks")
+
+            if not args.asr:
+                continue
+            processor = AudioProcessor()
+            waveform, sample_rate = sf.read(io.BytesIO(audio_bytes))
+            start = time.perf_counter()
+            # Whisper only sees the first 30 seconds of a clip passed in one piece
+            processor.asr_pipeline({"array": waveform, "sampling_rate": sample_rate})
+            print(f"⏱️ {seconds:6.0f}s whole clip in one call: RTF {(time.perf_counter() - start) / seconds:.3f}")
+            for batch_size in args.batch_size:
+                processor.batch_size = batch_size
+                result = processor.transcribe(audio_bytes)
+                print(f"⏱️ {seconds:6.0f}s chunked, batch size {batch_size}: RTF {result['rtf']:.3f}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
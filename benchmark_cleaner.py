@@ -0,0 +1,92 @@
+import argparse
+import random
+import sys
+import time
+import pyarrow.parquet as pq
+from Data_Cleaner import CleaningEngine, clean_text_reference
+
+SRT_TEMPLATE = "{index}\n00:{m:02d}:{s:02d},000 --> 00:{m:02d}:{s:02d},900\n<i>{line}</i>\n\n"
+ASS_HEADER = "[Script Info]\nTitle: Sample\n\n[V4+ Styles]\nFormat: Name, Fontname\n\n[Events]\n"
+ASS_TEMPLATE = "Dialogue: 0,0:{m:02d}:{s:02d}.00,0:{m:02d}:{s:02d}.90,Default,,0,0,0,,{{\\an8}}{line}\n"
+BOILERPLATE = [
+    "Support us and become VIP member",
+    "to remove all ads from www.OpenSubtitles.org",
+    "-== [ www.OpenSubtitles.com ] ==-",
+    "please rate this subtitle at www.osdb.link/abc123",
+    "help other users to choose the best subtitles",
+]
+WORDS = "i'll be back you talking to me here's looking at you kid may the force be with you".split()
+
+
+def sample_documents(count, cues=400, seed=0):
+    """Builds a mix of SRT and ASS documents shaped like the extracted subtitles."""
+    rng = random.Random(seed)
+    documents = []
+    for doc in range(count):
+        is_ass = doc % 4 == 0
+        parts = [ASS_HEADER] if is_ass else []
+        for cue in range(cues):
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 10)))
+            template = ASS_TEMPLATE if is_ass else SRT_TEMPLATE
+            parts.append(template.format(index=cue + 1, m=cue // 60 % 60, s=cue % 60, line=line))
+        parts.append(rng.choice(BOILERPLATE) + "\n")
+        documents.append("".join(parts))
+    return documents
+
+
+def load_documents(parquet_path, limit):
+    documents = []
+    for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=1000, columns=["subtitles"]):
+        documents.extend(str(text) for text in batch.column("subtitles").to_pylist())
+        if len(documents) >= limit:
+            break
+    return documents[:limit]
+
+
+def first_difference(expected, actual, context=60):
+    """Returns where two outputs first differ, with the text around that point in each."""
+    index = next((i for i, (a, b) in enumerate(zip(expected, actual)) if a != b), min(len(expected), len(actual)))
+    start = max(0, index - context)
+    return index, expected[start:index + context], actual[start:index + context]
+
+
+def docs_per_second(clean, documents):
+    start = time.perf_counter()
+    for text in documents:
+        clean(text)
+    return len(documents) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check and throughput benchmark for the subtitle cleaner.")
+    parser.add_argument("--parquet", help="Extracted subtitles Parquet (defaults to generated samples)")
+    parser.add_argument("--docs", type=int, default=2000, help="Number of documents to clean")
+    parser.add_argument("--show", type=int, default=3, help="Mismatching documents to print")
+    args = parser.parse_args()
+
+    documents = load_documents(args.parquet, args.docs) if args.parquet else sample_documents(args.docs)
+    engine = CleaningEngine()
+
+    mismatches = []
+    for i, text in enumerate(documents):
+        expected, actual = clean_text_reference(text), engine.clean(text)
+        if expected != actual:
+            mismatches.append((i, text, expected, actual))
+    print(f"🔍 Parity: {len(documents) - len(mismatches)}/{len(documents)} documents identical")
+    for i, text, expected, actual in mismatches[:args.show]:
+        index, expected_part, actual_part = first_difference(expected, actual)
+        print(f"❌ Document {i} differs at output character {index}:")
+        print(f"   input:                {text!r}")
+        print(f"   clean_text_reference: ...{expected_part!r}...")
+        print(f"   CleaningEngine:       ...{actual_part!r}...")
+
+    before = docs_per_second(clean_text_reference, documents)
+    after = docs_per_second(engine.clean, documents)
+    print(f"⏱️ clean_text_reference: {before:.1f} docs/sec")
+    print(f"⏱️ CleaningEngine:       {after:.1f} docs/sec ({after / before:.2f}x)")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import argparse
+import os
+import random
+import sys
+import time
+import numpy as np
+import pyarrow.parquet as pq
+from onnx_encoder import OnnxEncoder, default_model_dir, default_threads, export_quantized_model
+from Vectordb import encode_length_bucketed
+
+WORDS = ("i'll be back you talking to me here's looking at you kid may the force be with you "
+         "we're gonna need a bigger boat there's no place like home show me the money").split()
+
+
+def sample_texts(count, min_words, max_words, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))) for _ in range(count)]
+
+
+def load_texts(parquet_path, limit, max_words=200):
+    """Reads cleaned subtitles, cut to about a chunk's worth of words each."""
+    texts = []
+    for batch in pq.ParquetFile(parquet_path).iter_batches(batch_size=1000, columns=["subtitles"]):
+        texts.extend(" ".join(str(text).split()[:max_words]) for text in batch.column("subtitles").to_pylist())
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def cosines(a, b):
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def top_k_agreement(expected, texts, queries, k=10):
+    """Mean share of each query's top k texts under the reference embeddings (expected is
+    a (texts, queries) pair) that the given text and query embeddings rank in their top k."""
+    def top(text_vectors, query_vectors):
+        text_vectors = text_vectors / np.linalg.norm(text_vectors, axis=1, keepdims=True)
+        query_vectors = query_vectors / np.linalg.norm(query_vectors, axis=1, keepdims=True)
+        return np.argsort(-(query_vectors @ text_vectors.T), axis=1)[:, :k]
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(top(*expected), top(texts, queries))])
+
+
+def texts_per_second(model, texts, batch_size):
+    start = time.perf_counter()
+    encode_length_bucketed(texts, lambda bucket: model.encode(bucket, batch_size=len(bucket)), batch_size)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def query_latencies(model, queries):
+    model.encode(queries[0])
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.encode(query)
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check and throughput benchmark for the ONNX encoder.")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="SentenceTransformer model")
+    parser.add_argument("--onnx-dir", help="Exported model directory (exported on first use)")
+    parser.add_argument("--parquet", help="Cleaned subtitles Parquet (defaults to generated text)")
+    parser.add_argument("--texts", type=int, default=2000, help="Number of texts for the batch benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="Number of single queries")
+    parser.add_argument("--batch-size", type=int, default=64, help="Encode batch size")
+    parser.add_argument("--threads", type=int, nargs="+", help="Thread counts to try (defaults to 1, 2, 4 and all cores)")
+    parser.add_argument("--min-cosine", type=float, default=0.95, help="Lowest cosine similarity that passes parity")
+    args = parser.parse_args()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    onnx_dir = args.onnx_dir or default_model_dir(args.model)
+    if not os.path.exists(os.path.join(onnx_dir, "meta.json")):
+        export_quantized_model(args.model, onnx_dir)
+
+    texts = load_texts(args.parquet, args.texts) if args.parquet else sample_texts(args.texts, 20, 200)
+    queries = sample_texts(args.queries, 2, 12, seed=1)
+    cores = default_threads()
+    threads = sorted(set(args.threads or [t for t in (1, 2, 4) if t < cores] + [cores]))
+
+    reference = SentenceTransformer(args.model, device="cpu")
+
+    expected = reference.encode(texts + queries, batch_size=args.batch_size, convert_to_numpy=True)
+    expected = expected[:len(texts)], expected[len(texts):]
+    encoded = {}
+    failed = False
+    # A session keeps the memory of its largest batch, so only one is open at a time
+    for name, quantized in (("onnx fp32", False), ("onnx int8", True)):
+        actual = OnnxEncoder(onnx_dir, quantized=quantized).encode(texts + queries, batch_size=args.batch_size)
+        encoded[name] = actual[:len(texts)], actual[len(texts):]
+        text_similarity, query_similarity = (cosines(a, b) for a, b in zip(expected, encoded[name]))
+        failed |= bool(min(text_similarity.min(), query_similarity.min()) < args.min_cosine)
+        print(f"🔍 Parity {name}: mean cosine {np.concatenate([text_similarity, query_similarity]).mean():.5f}, "
+              f"min {text_similarity.min():.5f} (texts) {query_similarity.min():.5f} (queries), "
+              f"top-10 agreement {top_k_agreement(expected, *encoded[name]):.3f}")
+    # The app indexes with the int8 graph and encodes queries with the float32 one
+    print(f"🔍 Parity int8 texts, fp32 queries: top-10 agreement "
+          f"{top_k_agreement(expected, encoded['onnx int8'][0], encoded['onnx fp32'][1]):.3f}")
+
+    print(f"📊 {len(texts)} texts, {len(queries)} queries, {cores} cores")
+    for count in threads:
+        torch.set_num_threads(count)
+        for name in ("torch", "onnx fp32", "onnx int8"):
+            model = reference if name == "torch" else \
+                OnnxEncoder(onnx_dir, quantized=name == "onnx int8", intra_op_threads=count)
+            throughput = texts_per_second(model, texts, args.batch_size)
+            p50, p99 = query_latencies(model, queries)
+            print(f"⏱️ {name:<10} {count:>2} threads: {throughput:8.1f} texts/sec   query p50 {p50:6.2f} ms  p99 {p99:6.2f} ms")
+            del model
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
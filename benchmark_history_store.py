@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+import numpy as np
+from history_store import HistoryStore
+
+
+def sample_rows(count, sessions, response_chars, seed=0):
+    """Yields (session_id, query, response) rows spread over sessions, in batches of 10,000."""
+    rng = random.Random(seed)
+    response = "x" * response_chars
+    for start in range(0, count, 10_000):
+        yield [(f"session-{rng.randrange(sessions)}", f"movie where someone says line {i}", response)
+               for i in range(start, min(start + 10_000, count))]
+
+
+def report_latency(label, latencies):
+    print(f"⏱️ {label:<46} p50 {np.percentile(latencies, 50) * 1000:8.2f} ms  p99 {np.percentile(latencies, 99) * 1000:8.2f} ms")
+
+
+def report_rate(label, latencies, rows_per_call=1):
+    print(f"⏱️ {label:<46} {len(latencies) * rows_per_call / sum(latencies):10,.0f} rows/sec")
+
+
+def timed(fn, args_list):
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+# The previous main.py helpers: a connection per call, no index, users in a JSON file
+def old_load_history(db_path, session_id):
+    conn = sqlite3.connect(db_path)
+    history = conn.execute("SELECT query, response FROM chat_history WHERE session_id = ?", (session_id,)).fetchall()
+    conn.close()
+    return history
+
+
+def old_save_history(db_path, session_id, query, response):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO chat_history (session_id, query, response) VALUES (?, ?, ?)", (session_id, query, response))
+    conn.commit()
+    conn.close()
+
+
+def old_get_session_id(users_json, name):
+    with open(users_json, "r") as f:
+        users = json.load(f)
+    return next((user["uuid"] for user in users if user["name"] == name), None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat history and user lookups: per-call SQLite and users.json against HistoryStore.")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="History rows to load")
+    parser.add_argument("--sessions", type=int, default=20_000, help="Sessions the rows are spread over")
+    parser.add_argument("--users", type=int, default=20_000, help="Registered users")
+    parser.add_argument("--response-chars", type=int, default=200, help="Length of each stored response")
+    parser.add_argument("--lookups", type=int, default=200, help="Timed reads and writes per case")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="history_benchmark_")
+    try:
+        old_db = os.path.join(work_dir, "old.db")
+        conn = sqlite3.connect(old_db)
+        conn.execute("CREATE TABLE chat_history (session_id TEXT, query TEXT, response TEXT)")
+        for rows in sample_rows(args.rows, args.sessions, args.response_chars):
+            conn.executemany("INSERT INTO chat_history (session_id, query, response) VALUES (?, ?, ?)", rows)
+        conn.commit()
+        conn.close()
+
+        store = HistoryStore(os.path.join(work_dir, "history.db"))
+        start = time.perf_counter()
+        for rows in sample_rows(args.rows, args.sessions, args.response_chars):
+            store.add_messages(rows)
+        print(f"📊 {args.rows} rows over {args.sessions} sessions; bulk load {args.rows / (time.perf_counter() - start):,.0f} rows/sec")
+
+        rng = random.Random(1)
+        sessions = [(f"session-{rng.randrange(args.sessions)}",) for _ in range(args.lookups)]
+        # The old full read is only timed on a few sessions, it scans the whole table each time
+        report_latency("session load, per-call connection, no index", timed(lambda s: old_load_history(old_db, s), sessions[:20]))
+        report_latency("session page of 50, HistoryStore", timed(lambda s: store.history_page(s, 50), sessions))
+
+        messages = [(session, "a new query", "a new answer") for (session,) in sessions]
+        report_rate("save, per-call connection", timed(lambda *row: old_save_history(old_db, *row), messages))
+        report_rate("save, one row per transaction, HistoryStore", timed(lambda *row: store.add_messages([row]), messages))
+        batches = [(messages[i:i + 50],) for i in range(0, len(messages), 50)]
+        report_rate("save, 50 rows per transaction, HistoryStore", timed(store.add_messages, batches), rows_per_call=50)
+
+        users = [{"name": f"user-{i}", "uuid": str(uuid.uuid4())} for i in range(args.users)]
+        users_json = os.path.join(work_dir, "users.json")
+        with open(users_json, "w") as f:
+            json.dump(users, f, indent=4)
+        names = [(f"user-{rng.randrange(args.users)}",) for _ in range(args.lookups)]
+        report_latency(f"user lookup, users.json ({args.users} users)", timed(lambda name: old_get_session_id(users_json, name), names))
+        store.import_users_json(users_json)
+        report_latency("user lookup, HistoryStore", timed(store.get_session_id, names))
+        store.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
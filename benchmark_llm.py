@@ -0,0 +1,112 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from chat_llm import SYSTEM_TEMPLATE, StubChatModel, build_answer_chain, load_chat_model
+from history_writer import HistoryWriter
+
+MOVIES = "- The Terminator (Relevance Score: 0.21, Best Matches At: 1:02:10-1:03:10)\n- Jaws (Relevance Score: 0.35)"
+
+
+def prompt_inputs(query):
+    return {
+        "query": query,
+        "movie_list": MOVIES,
+        "explanation_prompt": "Respond only based on the retrieved movies and their relevance scores.",
+        "history": [],
+        "human_input": query,
+    }
+
+
+def rebuild_and_invoke(make_model, query):
+    """The old request path: a new client and chain per message, blocking until the whole answer arrives."""
+    start = time.perf_counter()
+    inputs = prompt_inputs(query)
+    prompt = ChatPromptTemplate.from_messages([
+        SystemMessage(content=SYSTEM_TEMPLATE.format(**inputs)),
+        MessagesPlaceholder(variable_name="history"),
+        HumanMessage(content=query)
+    ])
+    (prompt | make_model() | StrOutputParser()).invoke({"history": []})
+    total = time.perf_counter() - start
+    return total, total
+
+
+def shared_chain_stream(chain, query):
+    """The new request path: one shared chain, answer streamed chunk by chunk."""
+    start = time.perf_counter()
+    first_token = None
+    for _ in chain.stream(prompt_inputs(query)):
+        if first_token is None:
+            first_token = time.perf_counter() - start
+    return first_token, time.perf_counter() - start
+
+
+def save_inline(db_path, row):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO chat_history (session_id, query, response) VALUES (?, ?, ?)", row)
+    conn.commit()
+    conn.close()
+
+
+def save_rows(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO chat_history (session_id, query, response) VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def report(name, timings):
+    first, total = np.array(timings).T * 1000
+    print(f"⏱️ {name:<24} first token p50 {np.percentile(first, 50):7.1f} ms  p99 {np.percentile(first, 99):7.1f} ms  "
+          f"full answer p50 {np.percentile(total, 50):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to first token of the answer chain, old path against new.")
+    parser.add_argument("--backend", default="stub", help="stub, or gemini (needs API_KEY)")
+    parser.add_argument("--requests", type=int, default=20, help="Messages per path")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="Stub model delay before its first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Stub model delay between tokens")
+    args = parser.parse_args()
+
+    def make_model():
+        if args.backend == "stub":
+            return StubChatModel(first_token_delay=args.first_token_delay, token_delay=args.token_delay)
+        return load_chat_model(args.backend, os.getenv("API_KEY"))
+
+    queries = [f"movie where someone says i'll be back, take {i}" for i in range(args.requests)]
+    report("rebuild + invoke", [rebuild_and_invoke(make_model, query) for query in queries])
+    chain = build_answer_chain(make_model())
+    report("shared chain + stream", [shared_chain_stream(chain, query) for query in queries])
+
+    # What saving the exchange adds to each message, inline against handed to the writer thread
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, "history.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE chat_history (session_id TEXT, query TEXT, response TEXT)")
+        conn.close()
+        inline, background = [], []
+        writer = HistoryWriter(lambda rows: save_rows(db_path, rows))
+        for query in queries:
+            start = time.perf_counter()
+            save_inline(db_path, ("session", query, "answer"))
+            inline.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            writer.submit("session", query, "answer")
+            background.append(time.perf_counter() - start)
+        writer.close()
+        print(f"💾 History save per message: inline p50 {np.percentile(inline, 50) * 1000:.2f} ms, "
+              f"background p50 {np.percentile(background, 50) * 1000:.3f} ms")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from synthetic_corpus import QUOTES, WORDS, generate_zipfiles_db
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+# Metrics compared against a baseline run, and whether a larger value is better
+COMPARED_METRICS = {
+    "rows_per_sec": True,
+    "chunks_per_sec": True,
+    "queries_per_sec": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+    "peak_rss_mb": False,
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its finished worker processes, in MB."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1024 ** 2 if sys.platform == "darwin" else 1024
+    usage = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(usage / scale, 1)
+
+
+def in_fresh_process(stage, *args):
+    """Runs a stage in a new interpreter, so each stage's peak RSS is its own."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(stage, *args).result()
+
+
+def run_extract(db_path, output_parquet, num_workers):
+    from Data_Extractor import DataExtractor
+    start = time.perf_counter()
+    rows = DataExtractor(db_path, output_parquet, num_workers=num_workers).extract_subtitles()
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+def run_clean(input_parquet, output_parquet, num_workers):
+    import pyarrow.parquet as pq
+    from Data_Cleaner import DataCleaner
+    start = time.perf_counter()
+    DataCleaner(input_parquet, output_parquet, num_workers=num_workers, keep_timestamps=True).clean_subtitles()
+    seconds = time.perf_counter() - start
+    rows = pq.ParquetFile(output_parquet).metadata.num_rows
+    return {"rows": rows, "seconds": seconds, "rows_per_sec": rows / seconds, "peak_rss_mb": peak_rss_mb()}
+
+
+def run_load(store_path, parquet_file, model_name, encoder_backend, vector_backend):
+    import pyarrow.parquet as pq
+    from Data_Chunker import SubtitleChunker
+    from Vectordb import SubtitleVectorDB
+    start = time.perf_counter()
+    # No embedding cache, so every chunk is encoded
+    db = SubtitleVectorDB(store_path, parquet_file, model_name, cache_dir=None, chunker=SubtitleChunker(),
+                          backend=vector_backend, encoder_backend=encoder_backend)
+    load_start = time.perf_counter()
+    db.load_data()
+    seconds = time.perf_counter() - load_start
+    rows = pq.ParquetFile(parquet_file).metadata.num_rows
+    chunks = db.store.count()
+    return {"rows": rows, "chunks": chunks, "seconds": seconds, "rows_per_sec": rows / seconds,
+            "chunks_per_sec": chunks / seconds, "model_load_seconds": load_start - start, "peak_rss_mb": peak_rss_mb()}
+
+
+def run_queries(store_path, queries, model_name, encoder_backend, vector_backend, top_k):
+    from query_extraction import SubtitleVectorDB
+    db = SubtitleVectorDB(store_path, model_name, backend=vector_backend, encoder_backend=encoder_backend)
+    start = time.perf_counter()
+    db.query_subtitles(queries[0], top_k)
+    cold_start = time.perf_counter() - start
+
+    # Every query is distinct, so the result and embedding caches never answer for the store
+    latencies = []
+    for query in queries[1:]:
+        start = time.perf_counter()
+        db.query_subtitles(query, top_k)
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+    return {
+        "queries": len(latencies),
+        "cold_start_seconds": cold_start,
+        "queries_per_sec": len(latencies) / (latencies.sum() / 1000),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def sample_queries(count, seed=1):
+    """Quotes plus random phrases in the corpus vocabulary, all different from each other."""
+    rng = random.Random(seed)
+    queries = list(dict.fromkeys(QUOTES))
+    seen = set(queries)
+    while len(queries) < count:
+        query = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 8)))
+        if query not in seen:
+            seen.add(query)
+            queries.append(query)
+    return queries[:count]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Prints the change of each metric against a baseline run; returns the regressions beyond tolerance."""
+    regressions = []
+    for stage, metrics in results["stages"].items():
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = baseline.get("stages", {}).get(stage, {}).get(metric), metrics.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = "⚠️" if worse > tolerance else "  "
+            print(f"{flag} {stage:<8} {metric:<16} {old:12.2f} -> {new:12.2f}  ({change:+.1%})")
+            if worse > tolerance:
+                regressions.append(f"{stage}.{metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times each pipeline stage on a synthetic subtitle database.")
+    parser.add_argument("--rows", type=int, default=2000, help="Subtitle files in the generated database")
+    parser.add_argument("--cues", type=int, default=300, help="Dialogue lines per file")
+    parser.add_argument("--db", help="Existing zipfiles database to use instead of generating one")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes for extraction and cleaning")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Encoder name or local path; any small model will do")
+    parser.add_argument("--encoder-backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--vector-backend", choices=["chroma", "numpy"], default="numpy")
+    parser.add_argument("--queries", type=int, default=200, help="Timed queries")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--skip-index", action="store_true", help="Only time extraction and cleaning")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file for the results")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    try:
+        db_path = args.db
+        if not db_path:
+            db_path = os.path.join(work_dir, "subtitles.db")
+            start = time.perf_counter()
+            total_bytes = generate_zipfiles_db(db_path, args.rows, cues=args.cues)
+            print(f"📊 Generated {args.rows} subtitles ({total_bytes / 1024 ** 2:.1f} MB of ZIP content) "
+                  f"in {time.perf_counter() - start:.1f}s")
+
+        extracted = os.path.join(work_dir, "extracted.parquet")
+        cleaned = os.path.join(work_dir, "cleaned.parquet")
+        store_path = os.path.join(work_dir, "vectors")
+        stages = {
+            "extract": in_fresh_process(run_extract, db_path, extracted, args.workers),
+            "clean": in_fresh_process(run_clean, extracted, cleaned, args.workers),
+        }
+        if not args.skip_index:
+            stages["load"] = in_fresh_process(run_load, store_path, cleaned, args.model, args.encoder_backend,
+                                              args.vector_backend)
+            stages["query"] = in_fresh_process(run_queries, store_path, sample_queries(args.queries + 1), args.model,
+                                               args.encoder_backend, args.vector_backend, args.top_k)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for stage, metrics in stages.items():
+        if "rows_per_sec" in metrics:
+            summary = f"{metrics['rows']} rows in {metrics['seconds']:.2f}s, {metrics['rows_per_sec']:,.1f} rows/sec"
+            if "chunks" in metrics:
+                summary += f" ({metrics['chunks']} chunks, {metrics['chunks_per_sec']:,.1f} chunks/sec)"
+        else:
+            summary = (f"{metrics['queries_per_sec']:.1f} queries/sec, p50 {metrics['p50_ms']:.2f} ms, "
+                       f"p95 {metrics['p95_ms']:.2f} ms, p99 {metrics['p99_ms']:.2f} ms")
+        rss = f"{metrics['peak_rss_mb']:.0f} MB" if metrics["peak_rss_mb"] is not None else "n/a"
+        print(f"⏱️ {stage:<8} {summary}; peak RSS {rss}")
+
+    results = {
+        "run": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "options": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        },
+        "stages": stages,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        print(f"📊 Against {args.compare} (commit {baseline.get('run', {}).get('commit')}):")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} metrics regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import random
+import sys
+import time
+import httpx
+import numpy as np
+
+WORDS = ("i'll be back you talking to me here's looking at you kid may the force be with you "
+         "we're gonna need a bigger boat there's no place like home show me the money").split()
+
+
+def sample_queries(count, distinct, seed=0):
+    """Builds count queries drawn from distinct different phrases."""
+    rng = random.Random(seed)
+    phrases = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8))) + f" {i}" for i in range(distinct)]
+    return [rng.choice(phrases) for _ in range(count)]
+
+
+async def run_load(url, queries, concurrency, top_k, hybrid):
+    """Sends queries from concurrency workers at once; returns per-request latencies and the error count."""
+    latencies, errors = [], 0
+    pending = iter(queries)
+
+    async def worker(client):
+        nonlocal errors
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/query", json={"query": query, "top_k": top_k, "hybrid": hybrid})
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, errors
+
+
+def batch_size_delta(before, after):
+    return {size: count - before.get(size, 0) for size, count in after.items() if count - before.get(size, 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for search_service.py.")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Search service address")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32], help="Requests in flight")
+    parser.add_argument("--distinct", type=int, help="Distinct queries (defaults to all unique, so caches miss)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--hybrid", action="store_true", help="Fuse with the lexical index")
+    args = parser.parse_args()
+
+    failed = False
+    for level, concurrency in enumerate(args.concurrency):
+        # A new seed per level keeps each level's queries out of the previous level's cache
+        queries = sample_queries(args.requests, args.distinct or args.requests, seed=level)
+        before = httpx.get(f"{args.url}/metrics").json()["batch_sizes"]
+        start = time.perf_counter()
+        latencies, errors = asyncio.run(run_load(args.url, queries, concurrency, args.top_k, args.hybrid))
+        elapsed = time.perf_counter() - start
+        after = httpx.get(f"{args.url}/metrics").json()["batch_sizes"]
+
+        failed |= errors > 0
+        if not latencies:
+            print(f"❌ concurrency {concurrency}: all {errors} requests failed")
+            continue
+        batches = batch_size_delta(before, after)
+        mean_batch = sum(int(size) * count for size, count in batches.items()) / max(sum(batches.values()), 1)
+        print(f"⏱️ concurrency {concurrency:>3}: {len(latencies) / elapsed:8.1f} QPS  "
+              f"p50 {np.percentile(latencies, 50) * 1000:7.2f} ms  p99 {np.percentile(latencies, 99) * 1000:7.2f} ms  "
+              f"mean batch {mean_batch:5.1f}  errors {errors}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+from vector_store import ChromaStore, NumpyStore
+
+
+def sample_vectors(count, dim, clusters=1024, seed=0):
+    """Builds unit vectors grouped around random centres, shaped like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(clusters, size=count)] + 1.0 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_neighbours(vectors, queries, top_k):
+    scores = queries @ vectors.T
+    return [set(row) for row in np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]]
+
+
+def fill(store, vectors, batch_size=5000):
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch_size):
+        ids = [str(row) for row in range(i, min(i + batch_size, len(vectors)))]
+        store.upsert(ids, vectors[i:i + batch_size], [{"num": int(row)} for row in ids])
+    return time.perf_counter() - start
+
+
+def measure(name, open_store, queries, truth, top_k, build_seconds, path):
+    start = time.perf_counter()
+    store = open_store()
+    store.query(queries[:1], top_k)
+    cold_start = time.perf_counter() - start
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids = store.query(query[None, :], top_k)["ids"][0]
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len(expected & {int(entry_id) for entry_id in ids}) / top_k)
+
+    size = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+    print(f"{name:<28} recall@{top_k} {np.mean(recalls):.3f}  p50 {np.percentile(latencies, 50) * 1000:7.2f} ms  "
+          f"p95 {np.percentile(latencies, 95) * 1000:7.2f} ms  p99 {np.percentile(latencies, 99) * 1000:7.2f} ms  cold start {cold_start:6.2f} s  "
+          f"build {build_seconds:6.1f} s  {size / 1024 ** 2:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the vector store backends on the same data.")
+    parser.add_argument("--embeddings", help=".npy file of embeddings to index (defaults to generated vectors)")
+    parser.add_argument("--vectors", type=int, default=100_000, help="Number of generated vectors")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of generated vectors")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--top-k", type=int, default=50, help="Results per query")
+    parser.add_argument("--nlist", type=int, help="IVF lists (defaults to 4 * sqrt(vectors))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 16, 32], help="IVF lists scanned per query")
+    parser.add_argument("--skip-chroma", action="store_true", help="Only benchmark the NumPy store")
+    args = parser.parse_args()
+
+    vectors = np.load(args.embeddings).astype(np.float32) if args.embeddings else sample_vectors(args.vectors, args.dim)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    rng = np.random.default_rng(1)
+    # Queries are perturbed corpus vectors, so every query has close neighbours
+    queries = vectors[rng.choice(len(vectors), args.queries, replace=False)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_neighbours(vectors, queries, args.top_k)
+    print(f"📊 {len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries")
+
+    work_dir = tempfile.mkdtemp(prefix="vector_store_benchmark_")
+    try:
+        if not args.skip_chroma:
+            try:
+                import chromadb
+            except ImportError:
+                print("⏩ chromadb is not installed, skipping Chroma.")
+            else:
+                path = os.path.join(work_dir, "chroma")
+                build = fill(ChromaStore(path), vectors)
+                # A fresh client per open, so the cold start includes loading the HNSW index
+                measure("chroma (hnsw)", lambda: ChromaStore(path, client=chromadb.PersistentClient(path=path)),
+                        queries, truth, args.top_k, build, path)
+
+        for quantize in (False, True):
+            kind = "int8" if quantize else "float32"
+            path = os.path.join(work_dir, kind)
+            store = NumpyStore(path, quantize=quantize)
+            build = fill(store, vectors)
+            store.close()
+            measure(f"numpy {kind} exact", lambda: NumpyStore(path), queries, truth, args.top_k, build, path)
+
+            store = NumpyStore(path)
+            start = time.perf_counter()
+            store.build_ivf(nlist=args.nlist)
+            ivf_build = build + time.perf_counter() - start
+            store.close()
+            for nprobe in args.nprobe:
+                measure(f"numpy {kind} ivf nprobe={nprobe}", lambda: NumpyStore(path, nprobe=nprobe),
+                        queries, truth, args.top_k, ivf_build, path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import json
+import math
+import os
+import re
+import shutil
+import time
+from collections import Counter
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)*")
+SEGMENT_PREFIX = "segment_"
+
+
+def tokenize(text):
+    """Splits text into lowercase word tokens, keeping contractions such as i'll whole."""
+    return TOKEN_PATTERN.findall(text.lower().replace("\u2019", "'"))
+
+
+def segment_names(index_dir):
+    """Names of the finished segments in index_dir, oldest first; each build adds one."""
+    if not os.path.isdir(index_dir):
+        return ()
+    return tuple(sorted(name for name in os.listdir(index_dir) if name.startswith(SEGMENT_PREFIX)))
+
+
+class BM25IndexBuilder:
+    """Builds one segment of the on-disk BM25 index from a cleaned subtitles Parquet file.
+
+    Each build writes a new segment_NNNN directory holding:
+
+    - terms.txt: the vocabulary, one term per line (line number = term id)
+    - doc_freq.npy: number of documents containing each term
+    - offsets.npy: start of each sparse term's postings, plus the total at the end
+    - postings_docs.npy / postings_impacts.npy: doc ids and float16 BM25 term weights
+    - dense_terms.npy / dense_impacts.npy: one full row of weights per term found in
+      more than a third of the documents, where a row is smaller than sparse postings
+      and is added to the scores without a scatter
+    - docs.parquet: num, name, start and end per doc
+
+    Term weights (the tf and length part of BM25) are precomputed with the segment's
+    own average document length, so a query only multiplies them by idf and sums.
+    Postings are spilled to disk per batch and scattered into place with a counting
+    sort, so memory stays bounded by the batch size rather than the corpus. With a
+    chunker, documents are the same time-windowed chunks the vector database stores.
+    """
+
+    def __init__(self, parquet_file, index_dir, chunker=None, batch_size=1000, k1=1.2, b=0.75):
+        self.parquet_file = parquet_file
+        self.index_dir = index_dir
+        self.chunker = chunker
+        self.batch_size = batch_size
+        self.k1 = k1
+        self.b = b
+
+    def _documents(self):
+        parquet_file = pq.ParquetFile(self.parquet_file)
+        wanted = ["num", "name", "subtitles", "cue_start", "cue_end"]
+        columns = [name for name in wanted if name in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=self.batch_size, columns=columns):
+            df_chunk = batch.to_pandas()
+            if self.chunker is not None:
+                df_chunk = self.chunker.chunk_frame(df_chunk)
+            else:
+                df_chunk["start"], df_chunk["end"] = -1.0, -1.0
+            yield df_chunk[["num", "name", "start", "end", "subtitles"]]
+
+    def _next_segment(self):
+        existing = [int(name[len(SEGMENT_PREFIX):]) for name in os.listdir(self.index_dir) if name.startswith(SEGMENT_PREFIX)]
+        return max(existing, default=0) + 1
+
+    def build(self):
+        """Writes a new segment and returns the number of documents it holds."""
+        start = time.perf_counter()
+        os.makedirs(self.index_dir, exist_ok=True)
+        segment_dir = os.path.join(self.index_dir, f"{SEGMENT_PREFIX}{self._next_segment():04d}")
+        # Built under a temporary name so a crash never leaves a half-written segment behind
+        build_dir = os.path.join(self.index_dir, f".building_{os.path.basename(segment_dir)}")
+        shutil.rmtree(build_dir, ignore_errors=True)
+        os.makedirs(build_dir)
+
+        vocab = {}
+        doc_freq = np.zeros(0, dtype=np.int64)
+        runs, lengths = [], []
+        n_docs = 0
+        writer = None
+
+        try:
+            # Pass 1: count terms per document, spilling (term, doc, tf) triples per batch
+            for df_chunk in self._documents():
+                terms, docs, tfs = [], [], []
+                batch_lengths = np.empty(len(df_chunk), dtype=np.int32)
+                for i, text in enumerate(df_chunk["subtitles"]):
+                    counts = Counter(tokenize(str(text)))
+                    batch_lengths[i] = sum(counts.values())
+                    terms.extend(vocab.setdefault(term, len(vocab)) for term in counts)
+                    tfs.extend(counts.values())
+                    docs.extend([n_docs + i] * len(counts))
+
+                terms = np.asarray(terms, dtype=np.int64)
+                if len(vocab) > len(doc_freq):
+                    doc_freq = np.concatenate([doc_freq, np.zeros(len(vocab) - len(doc_freq), dtype=np.int64)])
+                doc_freq += np.bincount(terms, minlength=len(doc_freq))
+
+                run_path = os.path.join(build_dir, f"run_{len(runs):06d}.npz")
+                np.savez(run_path, terms=terms, docs=np.asarray(docs, dtype=np.int32),
+                         tfs=np.minimum(np.asarray(tfs, dtype=np.int64), np.iinfo(np.uint16).max).astype(np.uint16))
+                runs.append(run_path)
+                lengths.append(batch_lengths)
+
+                table = pa.Table.from_pandas(df_chunk[["num", "name", "start", "end"]], preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(os.path.join(build_dir, "docs.parquet"), table.schema)
+                writer.write_table(table)
+                n_docs += len(df_chunk)
+        finally:
+            if writer:
+                writer.close()
+
+        if n_docs == 0:
+            shutil.rmtree(build_dir)
+            print("⏩ No documents to add to the lexical index.")
+            return 0
+
+        doc_lengths = np.concatenate(lengths)
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(doc_lengths.mean(), 1.0))
+
+        dense_terms = np.flatnonzero(doc_freq * 3 > n_docs)
+        dense_rows = np.full(len(vocab), -1, dtype=np.int64)
+        dense_rows[dense_terms] = np.arange(len(dense_terms))
+        sparse_freq = np.where(dense_rows < 0, doc_freq, 0)
+        offsets = np.concatenate([[0], np.cumsum(sparse_freq)]).astype(np.int64)
+
+        def open_array(name, dtype, shape):
+            # open_memmap needs a non-empty shape
+            return np.lib.format.open_memmap(os.path.join(build_dir, name), mode="w+", dtype=dtype,
+                                             shape=shape if np.prod(shape) else (0,) * len(shape))
+
+        postings_docs = open_array("postings_docs.npy", np.int32, (int(offsets[-1]),))
+        postings_impacts = open_array("postings_impacts.npy", np.float16, (int(offsets[-1]),))
+        dense_impacts = open_array("dense_impacts.npy", np.float16, (len(dense_terms), n_docs))
+
+        # Pass 2: scatter every run into its terms' slots; docs stay ascending within a term
+        filled = np.zeros(len(vocab), dtype=np.int64)
+        for run_path in runs:
+            with np.load(run_path) as run:
+                terms, docs = run["terms"], run["docs"]
+                tfs = run["tfs"].astype(np.float32)
+                impacts = (tfs * (self.k1 + 1) / (tfs + norm[docs])).astype(np.float16)
+
+                rows = dense_rows[terms]
+                is_dense = rows >= 0
+                dense_impacts[rows[is_dense], docs[is_dense]] = impacts[is_dense]
+
+                terms, docs, impacts = terms[~is_dense], docs[~is_dense], impacts[~is_dense]
+                order = np.argsort(terms, kind="stable")
+                terms = terms[order]
+                unique, first, counts = np.unique(terms, return_index=True, return_counts=True)
+                rank = np.arange(len(terms)) - np.repeat(first, counts)
+                positions = offsets[terms] + filled[terms] + rank
+                postings_docs[positions] = docs[order]
+                postings_impacts[positions] = impacts[order]
+                filled[unique] += counts
+            os.remove(run_path)
+        for array in (postings_docs, postings_impacts, dense_impacts):
+            array.flush()
+        del postings_docs, postings_impacts, dense_impacts
+
+        np.save(os.path.join(build_dir, "offsets.npy"), offsets)
+        np.save(os.path.join(build_dir, "doc_freq.npy"), doc_freq.astype(np.int32))
+        np.save(os.path.join(build_dir, "dense_terms.npy"), dense_terms)
+        with open(os.path.join(build_dir, "terms.txt"), "w", encoding="utf-8") as f:
+            f.writelines(f"{term}\n" for term in vocab)
+        with open(os.path.join(build_dir, "meta.json"), "w") as f:
+            json.dump({"n_docs": n_docs, "n_terms": len(vocab), "k1": self.k1, "b": self.b}, f)
+
+        os.replace(build_dir, segment_dir)
+        print(f"✅ Lexical index segment {os.path.basename(segment_dir)}: {n_docs} docs, {len(vocab)} terms "
+              f"({len(dense_terms)} dense), {int(offsets[-1])} postings in {time.perf_counter() - start:.1f}s")
+        return n_docs
+
+
+class _Segment:
+    def __init__(self, segment_dir):
+        with open(os.path.join(segment_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(segment_dir, "terms.txt"), encoding="utf-8") as f:
+            self.vocab = {line.rstrip("\n"): i for i, line in enumerate(f)}
+
+        # Postings stay on disk and are paged in by the OS as terms are looked up
+        self.doc_freqs = np.load(os.path.join(segment_dir, "doc_freq.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(segment_dir, "offsets.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(segment_dir, "postings_docs.npy"), mmap_mode="r")
+        self.impacts = np.load(os.path.join(segment_dir, "postings_impacts.npy"), mmap_mode="r")
+        self.dense = np.load(os.path.join(segment_dir, "dense_impacts.npy"), mmap_mode="r")
+        self.dense_rows = {int(term_id): row for row, term_id in enumerate(np.load(os.path.join(segment_dir, "dense_terms.npy")))}
+
+        table = pq.read_table(os.path.join(segment_dir, "docs.parquet"))
+        self.nums = table.column("num").to_numpy()
+        self.starts = table.column("start").to_numpy()
+        self.ends = table.column("end").to_numpy()
+        names = table.column("name").combine_chunks().dictionary_encode()
+        self.name_ids = names.indices.to_numpy()
+        self.names = names.dictionary.to_pylist()
+
+    def add_scores(self, scores, term, idf):
+        """Adds idf-weighted impacts of term to scores; returns False if the term is not in the segment."""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return False
+        row = self.dense_rows.get(term_id)
+        if row is not None:
+            scores += idf * self.dense[row].astype(np.float32)
+        else:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # A doc appears once per term's postings, so fancy-index accumulation is safe
+            docs = self.docs[start:end]
+            scores[docs] += idf * self.impacts[start:end].astype(np.float32)
+        return True
+
+    def doc_freq(self, term):
+        term_id = self.vocab.get(term)
+        return 0 if term_id is None else int(self.doc_freqs[term_id])
+
+
+class BM25Index:
+    """Read side of the segmented BM25 index written by BM25IndexBuilder.
+
+    Document counts and frequencies behind idf are global across segments. A subtitle
+    re-indexed in a newer segment hides its documents in older ones, so incremental
+    builds never return stale text.
+    """
+
+    def __init__(self, index_dir):
+        self.segment_names = segment_names(index_dir)
+        self.segments = [_Segment(os.path.join(index_dir, name)) for name in self.segment_names]
+
+        self.n_docs = sum(segment.meta["n_docs"] for segment in self.segments)
+
+        superseded = np.zeros(0, dtype=np.int64)
+        for segment in reversed(self.segments):
+            segment.live = ~np.isin(segment.nums, superseded)
+            superseded = np.union1d(superseded, segment.nums)
+
+    def idf(self, doc_freq):
+        return math.log(1 + (self.n_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+    def search(self, query, top_k=50):
+        """Returns up to top_k (num, name, start, end, score) hits, best first."""
+        terms = set(tokenize(query))
+        if not terms or not self.n_docs:
+            return []
+
+        idf = {term: self.idf(sum(segment.doc_freq(term) for segment in self.segments)) for term in terms}
+        hits = []
+        for segment in self.segments:
+            scores = np.zeros(segment.meta["n_docs"], dtype=np.float32)
+            matched = [segment.add_scores(scores, term, idf[term]) for term in terms]
+            if not any(matched):
+                continue
+            scores[~segment.live] = 0
+            top = np.argpartition(-scores, min(top_k, len(scores) - 1))[:top_k]
+            for doc in top[scores[top] > 0]:
+                hits.append((float(scores[doc]), segment, int(doc)))
+
+        hits.sort(key=lambda hit: -hit[0])
+        return [
+            (int(segment.nums[doc]), segment.names[segment.name_ids[doc]], float(segment.starts[doc]),
+             float(segment.ends[doc]), score)
+            for score, segment, doc in hits[:top_k]
+        ]
@@ -0,0 +1,82 @@
+import re
+import time
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+SYSTEM_TEMPLATE = """
+        You are an AI-powered movie search assistant.
+
+        **User Query:** {query}
+
+        **Relevant Movies Retrieved:**
+        {movie_list}
+
+        {explanation_prompt}
+        """
+
+# Built once: the per-message parts (query, retrieved movies, history) are template variables
+ANSWER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_TEMPLATE),
+    MessagesPlaceholder(variable_name="history"),
+    ("human", "{human_input}")
+])
+
+
+class StubChatModel(BaseChatModel):
+    """Offline stand-in for the chat model, for tests and time-to-first-token benchmarks.
+
+    Streams back the movie list from the system prompt a word at a time, after
+    first_token_delay seconds and then token_delay seconds per word, roughly the shape
+    of a hosted model's stream.
+    """
+
+    first_token_delay: float = 0.3
+    token_delay: float = 0.02
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    @staticmethod
+    def answer(messages):
+        system = next((message.content for message in messages if message.type == "system"), "")
+        movies = [line.strip() for line in system.splitlines() if line.strip().startswith("- ")]
+        if not movies:
+            return "Sorry, no relevant movies were retrieved for your query."
+        return "Here are the movies that best match your query:\n" + "\n".join(movies)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(re.findall(r"\s*\S+", self.answer(messages))):
+            if i:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def load_chat_model(backend="gemini", api_key=None, model="gemini-1.5-pro", temperature=0.7):
+    """Builds the chat model: Gemini ("gemini") or the offline StubChatModel ("stub")."""
+    if backend == "gemini":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(api_key=api_key, model=model, temperature=temperature)
+    if backend == "stub":
+        return StubChatModel()
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+def build_answer_chain(chat_model):
+    """Returns the prompt | model | parser chain; stream() it to get the answer as text chunks.
+
+    Takes query, movie_list, explanation_prompt, history (a list of messages) and
+    human_input. The chain keeps no state, so one instance serves every session.
+    """
+    return ANSWER_PROMPT | chat_model | StrOutputParser()
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+import sqlite3
+import time
+import numpy as np
+from query_cache import LRUCache
+
+
+def text_hash(text):
+    """Returns the content address of a document."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent embedding cache keyed by (model name, text hash).
+
+    Each model gets its own directory. Vectors are appended as float32 .npy shards, one
+    per batch of misses, and read back memory-mapped, so rebuilding a collection,
+    switching vector stores or re-chunking reuses them without running the model. A
+    SQLite index maps text hashes to (shard, row). When the shards grow past max_bytes,
+    whole shards are evicted least recently used first. At most max_open_shards shards
+    stay memory-mapped at once, so large corpora do not run out of file descriptors.
+    """
+
+    def __init__(self, cache_dir, model_name, max_bytes=2 * 1024 ** 3, max_open_shards=64):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.cache_dir = os.path.join(cache_dir, re.sub(r"[^\w.-]+", "_", model_name))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(self.cache_dir, "index.db"))
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+                                 text_hash TEXT PRIMARY KEY, shard INTEGER, row INTEGER)''')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS shards (
+                                 shard INTEGER PRIMARY KEY, bytes INTEGER, last_used REAL)''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_shard ON entries (shard)")
+
+        self.shards = LRUCache(maxsize=max_open_shards)  # shard id -> memory-mapped array
+        self.stats = {"hits": 0, "misses": 0, "evicted_shards": 0}
+
+    def _shard_path(self, shard):
+        return os.path.join(self.cache_dir, f"shard_{shard:06d}.npy")
+
+    def _shard(self, shard):
+        array = self.shards.get(shard)
+        if array is None:
+            # A mapping pushed out of the LRU is closed once its last view is gone
+            array = np.load(self._shard_path(shard), mmap_mode="r")
+            self.shards.put(shard, array)
+        return array
+
+    def _lookup(self, hashes):
+        found = {}
+        unique = list(set(hashes))
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(unique), 900):
+            part = unique[i:i + 900]
+            placeholders = ",".join("?" * len(part))
+            for digest, shard, row in self.conn.execute(
+                f"SELECT text_hash, shard, row FROM entries WHERE text_hash IN ({placeholders})", part
+            ):
+                found[digest] = (shard, row)
+        return found
+
+    def encode(self, texts, encode_fn):
+        """Returns float32 embeddings for texts, calling encode_fn only for texts not in the cache."""
+        hashes = [text_hash(text) for text in texts]
+        found = self._lookup(hashes)
+        self._touch({shard for shard, _ in found.values()})
+
+        # Copy cached rows out of the shards before storing anything that may evict them;
+        # reading shard by shard opens each one once per batch
+        vectors = {
+            digest: np.array(self._shard(shard)[row])
+            for digest, (shard, row) in sorted(found.items(), key=lambda item: item[1])
+        }
+
+        missing = {}
+        for text, digest in zip(texts, hashes):
+            if digest not in vectors:
+                missing.setdefault(digest, text)
+
+        hits = sum(digest in found for digest in hashes)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(hashes) - hits
+
+        if missing:
+            encoded = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            vectors.update(zip(missing.keys(), encoded))
+            self._store(list(missing.keys()), encoded)
+
+        if not hashes:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([vectors[digest] for digest in hashes])
+
+    def _touch(self, shards):
+        if shards:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany("UPDATE shards SET last_used = ? WHERE shard = ?", [(now, shard) for shard in shards])
+
+    def _store(self, hashes, vectors):
+        shard = (self.conn.execute("SELECT MAX(shard) FROM shards").fetchone()[0] or 0) + 1
+        np.save(self._shard_path(shard), vectors)
+
+        with self.conn:
+            self.conn.execute("INSERT INTO shards (shard, bytes, last_used) VALUES (?, ?, ?)",
+                              (shard, int(vectors.nbytes), time.time()))
+            self.conn.executemany("INSERT OR REPLACE INTO entries (text_hash, shard, row) VALUES (?, ?, ?)",
+                                  [(digest, shard, row) for row, digest in enumerate(hashes)])
+        self._evict(keep=shard)
+
+    def _evict(self, keep):
+        total = self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM shards").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for shard, size in self.conn.execute(
+            "SELECT shard, bytes FROM shards WHERE shard != ? ORDER BY last_used ASC", (keep,)
+        ).fetchall():
+            with self.conn:
+                self.conn.execute("DELETE FROM entries WHERE shard = ?", (shard,))
+                self.conn.execute("DELETE FROM shards WHERE shard = ?", (shard,))
+            # Drop the memory map before deleting, otherwise Windows keeps the file locked
+            self.shards.pop(shard, None)
+            os.remove(self._shard_path(shard))
+            self.stats["evicted_shards"] += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def size_bytes(self):
+        return self.conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM shards").fetchone()[0]
+
+    def print_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        print(f"📊 Embedding cache: {self.stats['hits']} hits, {self.stats['misses']} misses "
+              f"({hit_rate:.1%} hit rate), {self.stats['evicted_shards']} shards evicted, "
+              f"{self.size_bytes() / 1024 ** 2:.1f} MB on disk")
+
+    def close(self):
+        self.shards.clear()
+        self.conn.close()
@@ -0,0 +1,101 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+
+class HistoryStore:
+    """Chat history and users, kept together in one SQLite database.
+
+    The store opens one connection and shares it between the app's threads through a
+    lock. The database runs in WAL mode with synchronous=NORMAL, so commits are cheap,
+    and readers in other processes are not blocked by the history writer.
+    chat_history is indexed on (session_id, id). A session's messages are read a page at
+    a time, newest page first, without scanning other sessions. users holds one row
+    per name; the UNIQUE constraints keep two sessions from registering the same name
+    twice. Users from an old users.json are imported on first open.
+    """
+
+    def __init__(self, db_path, users_json=None):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            with self.conn:
+                self._migrate_history()
+                self.conn.execute('''CREATE TABLE IF NOT EXISTS chat_history (
+                                     id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, query TEXT, response TEXT)''')
+                self.conn.execute("CREATE INDEX IF NOT EXISTS chat_history_session ON chat_history (session_id, id)")
+                self.conn.execute('''CREATE TABLE IF NOT EXISTS users (
+                                     id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, session_id TEXT NOT NULL UNIQUE)''')
+        if users_json and os.path.exists(users_json):
+            self.import_users_json(users_json)
+
+    def _migrate_history(self):
+        """Gives a chat_history table from before this store an id column, keeping message order."""
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(chat_history)")]
+        if columns and "id" not in columns:
+            self.conn.execute("ALTER TABLE chat_history RENAME TO chat_history_old")
+            self.conn.execute('''CREATE TABLE chat_history (
+                                 id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, query TEXT, response TEXT)''')
+            self.conn.execute('''INSERT INTO chat_history (session_id, query, response)
+                                 SELECT session_id, query, response FROM chat_history_old ORDER BY rowid''')
+            self.conn.execute("DROP TABLE chat_history_old")
+            print("✅ Migrated chat history to the indexed schema.")
+
+    def import_users_json(self, users_json):
+        """Copies users from a users.json file into the database, then renames the file out of the way."""
+        with open(users_json, "r") as f:
+            users = json.load(f)
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO users (name, session_id) VALUES (?, ?)",
+                [(user["name"], user["uuid"]) for user in users]
+            )
+        os.replace(users_json, users_json + ".imported")
+        print(f"✅ Imported {len(users)} users from {users_json}.")
+
+    def list_users(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT name FROM users ORDER BY id")]
+
+    def get_session_id(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT session_id FROM users WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def add_user(self, name):
+        """Registers name and returns its session id; a name that already exists keeps its session."""
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO users (name, session_id) VALUES (?, ?)", (name, str(uuid.uuid4())))
+            return self.conn.execute("SELECT session_id FROM users WHERE name = ?", (name,)).fetchone()[0]
+
+    def add_messages(self, rows):
+        """Saves (session_id, query, response) rows in one transaction."""
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO chat_history (session_id, query, response) VALUES (?, ?, ?)", rows)
+
+    def history_page(self, session_id, limit=50, before_id=None):
+        """Returns up to limit (id, query, response) rows of a session, oldest first.
+
+        Without before_id this is the latest page; pass the id of a page's first row to
+        get the page before it.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                '''SELECT id, query, response FROM chat_history
+                   WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?''',
+                (session_id, before_id if before_id is not None else 2 ** 63 - 1, limit)
+            ).fetchall()
+        return rows[::-1]
+
+    def count_messages(self, session_id):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM chat_history WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
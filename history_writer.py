@@ -0,0 +1,63 @@
+import atexit
+import queue
+import threading
+
+
+class HistoryWriter:
+    """Saves chat history on a background thread, so answering never waits on the database.
+
+    Rows passed to submit() are handed to write_rows in batches: everything queued when
+    the thread wakes up, at most max_batch rows per call. flush() blocks until every
+    submitted row is written; queued rows are also flushed when the process exits.
+    Once the writer is closed, submit() writes on the calling thread instead.
+    """
+
+    def __init__(self, write_rows, max_batch=500):
+        self.write_rows = write_rows
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._closed = False
+        # Keeps a row from being queued behind the stop marker, where nothing would write it
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, *row):
+        with self._lock:
+            if not self._closed:
+                self._queue.put(row)
+                return
+        self.write_rows([row])
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            rows = [self._queue.get()]
+            while len(rows) < self.max_batch:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = [row for row in rows if row is not None]
+            try:
+                if batch:
+                    self.write_rows(batch)
+            except Exception as e:
+                print(f"⚠️ Failed to save {len(batch)} chat history rows: {e}")
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+            if len(batch) < len(rows):
+                return
@@ -1,87 +1,76 @@
 import streamlit as st
 import os
-import sqlite3
-import uuid
-import json
+import hashlib
 from dotenv import load_dotenv
 from audio_handler import AudioProcessor
 from query_extraction import SubtitleVectorDB
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_core.messages import HumanMessage, SystemMessage
+from model_registry import registry
+from search_client import SearchClient
+from chat_llm import build_answer_chain, load_chat_model
+from history_store import HistoryStore
+from history_writer import HistoryWriter
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_community.chat_message_histories import ChatMessageHistory
 
 load_dotenv()
 API_KEY = os.getenv("API_KEY")
-
-DB_PATH = "./chroma_db"
+# "gemini", or "stub" for the offline stand-in in chat_llm.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# "chroma", or "numpy" for the memory-mapped store in vector_store.py
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+DB_PATH = "./chroma_db" if VECTOR_BACKEND == "chroma" else "./numpy_store"
+# "torch", or "onnx" for the int8 ONNX Runtime query encoder (see onnx_encoder.py)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+LEXICAL_INDEX_DIR = "./lexical_index"
+# Address of a running search_service.py; unset to load the models in this process
+SEARCH_SERVICE_URL = os.getenv("SEARCH_SERVICE_URL")
 HISTORY_DB = "./history.db"
+# Users from an older users.json are moved into the history database on first run
 USER_JSON = "./users.json"
-
-if not os.path.exists(USER_JSON):
-    with open(USER_JSON, "w") as f:
-        json.dump([], f)
-
-def load_users():
-    with open(USER_JSON, "r") as f:
-        return json.load(f)
-
-def save_users(users):
-    with open(USER_JSON, "w") as f:
-        json.dump(users, f, indent=4)
-
-def get_session_id(username):
-    users = load_users()
-    for user in users:
-        if user["name"] == username:
-            return user["uuid"]
-    return None
-
-def add_new_user(username):
-    users = load_users()
-    new_uuid = str(uuid.uuid4())
-    users.append({"name": username, "uuid": new_uuid})
-    save_users(users)
-    return new_uuid
-
-def initialize_db():
-    conn = sqlite3.connect(HISTORY_DB)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS chat_history (
-                 session_id TEXT, query TEXT, response TEXT)''')
-    conn.commit()
-    conn.close()
-
-initialize_db()
-
-def load_history(session_id):
-    conn = sqlite3.connect(HISTORY_DB)
-    c = conn.cursor()
-    c.execute("SELECT query, response FROM chat_history WHERE session_id = ?", (session_id,))
-    history = c.fetchall()
-    conn.close()
-    return history
-
-def save_history(session_id, query, response):
-    conn = sqlite3.connect(HISTORY_DB)
-    c = conn.cursor()
-    c.execute("INSERT INTO chat_history (session_id, query, response) VALUES (?, ?, ?)",
-              (session_id, query, response))
-    conn.commit()
-    conn.close()
-
-db = SubtitleVectorDB(db_path=DB_PATH)
-
-def setup_chat_model():
-    return ChatGoogleGenerativeAI(api_key=API_KEY, model="gemini-1.5-pro", temperature=0.7)
-
-def create_prompt(query, related_data):
-    filtered_movies = [(movie, score) for movie, score in related_data if 0 <= score <= 1]
+HISTORY_PAGE_SIZE = 50
+# Recordings are transcribed in memory; set RECORDINGS_DIR to also keep them on disk
+RECORDINGS_DIR = os.getenv("RECORDINGS_DIR")
+
+# One connection for all sessions; exchanges are saved in batches on a background thread
+history_store = registry.get(f"history_store:{HISTORY_DB}", lambda: HistoryStore(HISTORY_DB, users_json=USER_JSON))
+history_writer = registry.get(f"history_writer:{HISTORY_DB}", lambda: HistoryWriter(history_store.add_messages))
+
+def load_history_page(session_id, before_id=None):
+    """Returns a page of (query, response) pairs, oldest first, and the id to load the page before it."""
+    rows = history_store.history_page(session_id, HISTORY_PAGE_SIZE, before_id)
+    first_id = rows[0][0] if len(rows) == HISTORY_PAGE_SIZE else None
+    return [(query, response) for _, query, response in rows], first_id
+
+# Shared across reruns and sessions so its query caches stay warm; models load on first query.
+# With a search service the models stay warm across app restarts and queries are batched across sessions.
+if SEARCH_SERVICE_URL:
+    db = registry.get(f"search_client:{SEARCH_SERVICE_URL}", lambda: SearchClient(SEARCH_SERVICE_URL))
+else:
+    db = registry.get(f"search_db:{DB_PATH}", lambda: SubtitleVectorDB(
+        db_path=DB_PATH, lexical_index_dir=LEXICAL_INDEX_DIR, backend=VECTOR_BACKEND, encoder_backend=ENCODER_BACKEND
+    ))
+
+def get_answer_chain():
+    # One chat model client and chain for all sessions; each message only fills in the prompt variables
+    return registry.get(f"answer_chain:{LLM_BACKEND}", lambda: build_answer_chain(load_chat_model(LLM_BACKEND, API_KEY)))
+
+def format_timestamp(seconds):
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+def describe_timestamps(timestamps):
+    if not timestamps:
+        return ""
+    spans = ", ".join(f"{format_timestamp(start)}-{format_timestamp(end)}" for start, end in timestamps)
+    return f", Best Matches At: {spans}"
+
+def prompt_inputs(query, related_data, min_score=0.0):
+    filtered_movies = [(movie, score, timestamps) for movie, score, timestamps in related_data if score >= min_score]
     movie_list = "\n".join([
-        f"- {movie} (Relevance Score: {score:.2f})"
-        for movie, score in filtered_movies
+        f"- {movie} (Relevance Score: {score:.2f}{describe_timestamps(timestamps)})"
+        for movie, score, timestamps in filtered_movies
     ]) if filtered_movies else "No relevant movies found."
 
     explanation_prompt = (
@@ -89,44 +78,32 @@ def create_prompt(query, related_data):
         "Do not make assumptions or suggest movies outside the list."
     ) if filtered_movies else "Inform the user that no relevant movies were retrieved."
 
-    return ChatPromptTemplate.from_messages([
-        SystemMessage(content=f"""
-        You are an AI-powered movie search assistant.
-
-        **User Query:** {query}
-        
-        **Relevant Movies Retrieved:**
-        {movie_list}
-        
-        {explanation_prompt}
-        """),
-        MessagesPlaceholder(variable_name="history"),
-        HumanMessage(content="{human_input}")
-    ])
+    return {"query": query, "movie_list": movie_list, "explanation_prompt": explanation_prompt}
 
 def generate_response(user_query):
-    related_data = db.query_subtitles(user_query, top_k=3)
-    chat_model = setup_chat_model()
-    chat_prompt = create_prompt(user_query, related_data)
-
-    conversation_chain = RunnableWithMessageHistory(
-        chat_prompt | chat_model | StrOutputParser(),
-        lambda session_id: st.session_state.chat_history,
-        input_messages_key="human_input",
-        history_messages_key="history"
+    """Yields the answer in chunks as the model produces them, then records the exchange."""
+    # Hybrid search also matches exact quotes when the lexical index has been built
+    hybrid = db.has_lexical_index()
+    related_data = db.query_subtitles(user_query, top_k=3, hybrid=hybrid)
+    # Vector-only scores are cosine similarities; 0.5 is the old cut-off at distance 1.
+    # Fused scores are rank based, and every title in them ranked near the top of a list.
+    min_score = 0.0 if hybrid else 0.5
+    inputs = dict(
+        prompt_inputs(user_query, related_data, min_score),
+        history=st.session_state.chat_history.messages,
+        human_input=user_query
     )
 
-    response = conversation_chain.invoke(
-        {"human_input": user_query},
-        {"configurable": {"session_id": st.session_state.session_id}}
-    )
+    chunks = []
+    for chunk in get_answer_chain().stream(inputs):
+        chunks.append(chunk)
+        yield chunk
 
+    response = "".join(chunks)
     if response:
         st.session_state.chat_history.add_message(HumanMessage(content=user_query))
-        st.session_state.chat_history.add_message(SystemMessage(content=response))
-        save_history(st.session_state.session_id, user_query, response)
-
-    return response
+        st.session_state.chat_history.add_message(AIMessage(content=response))
+        history_writer.submit(st.session_state.session_id, user_query, response)
 
 def process_chat_input(user_input):
     if user_input:
@@ -134,13 +111,37 @@ def process_chat_input(user_input):
             st.warning("Please select or create a user session first.")
             return  
 
-        ai_response = generate_response(user_input)
+        st.chat_message("user", avatar="👤").write(user_input)
+        ai_response = st.chat_message("ai", avatar="🤖").write_stream(generate_response(user_input))
 
         if not st.session_state.display_history or (st.session_state.display_history[-1] != (user_input, ai_response)):
             st.session_state.display_history.append((user_input, ai_response))
 
         st.rerun() 
 
+def transcribe_recording(recorded_audio):
+    """Transcribes a recording once; reruns of the script (such as clicking Send) reuse the result."""
+    audio_bytes = recorded_audio.getvalue()
+    key = hashlib.blake2b(audio_bytes, digest_size=16).hexdigest()
+    if st.session_state.get("transcription_key") != key:
+        audio_processor = AudioProcessor(save_dir=RECORDINGS_DIR)
+        st.session_state.transcription = audio_processor.transcribe(audio_bytes)
+        st.session_state.transcription_key = key
+    return st.session_state.transcription
+
+def show_model_load_times():
+    if registry.load_times:
+        with st.sidebar.expander("⏱️ Model Load Times"):
+            for name, seconds in registry.load_times.items():
+                st.write(f"{name}: {seconds:.2f}s")
+
+def show_cache_metrics():
+    metrics = db.cache_metrics()
+    if any(cache["hits"] + cache["misses"] for cache in metrics.values()):
+        with st.sidebar.expander("📊 Search Cache"):
+            for name, cache in metrics.items():
+                st.write(f"{name}: {cache['hit_rate']:.0%} hit rate ({cache['hits']} hits, {cache['size']} entries)")
+
 def main():
     st.set_page_config(page_title="Sub Search Chatbot", layout="wide")
     st.title("🎬 Sub Search Chatbot")
@@ -151,12 +152,13 @@ def main():
         st.session_state.session_id = None
     if "display_history" not in st.session_state:
         st.session_state.display_history = []
+    if "history_before_id" not in st.session_state:
+        st.session_state.history_before_id = None
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = ChatMessageHistory()
 
     st.sidebar.header("User Session")
-    users = load_users()
-    user_options = [user["name"] for user in users] + ["Create New User"]
+    user_options = history_store.list_users() + ["Create New User"]
     selected_user = st.sidebar.selectbox("Select or create a new user:", user_options, key="selected_user")
 
     if selected_user == "Create New User":
@@ -164,15 +166,19 @@ def main():
         if st.sidebar.button("Submit New User", key="submit_new_user"):
             if new_user.strip():
                 st.session_state.username = new_user.strip()
-                st.session_state.session_id = add_new_user(st.session_state.username)
+                st.session_state.session_id = history_store.add_user(st.session_state.username)
                 st.rerun()
 
     elif selected_user:
         if st.sidebar.button("Load Session", key="load_session"):
             if st.session_state.username != selected_user:
                 st.session_state.username = selected_user
-                st.session_state.session_id = get_session_id(selected_user)
-                st.session_state.display_history = load_history(st.session_state.session_id)
+                st.session_state.session_id = history_store.get_session_id(selected_user)
+                # Make sure the latest exchanges have reached the database before reading it
+                history_writer.flush()
+                st.session_state.display_history, st.session_state.history_before_id = load_history_page(
+                    st.session_state.session_id
+                )
                 st.session_state.chat_history = ChatMessageHistory()
                 st.rerun()
 
@@ -181,6 +187,13 @@ def main():
 
         input_mode = st.sidebar.radio("Choose Input Mode:", ["Text Chat", "Voice Input"])
 
+        if st.session_state.history_before_id is not None and st.button("Load earlier messages", key="load_earlier"):
+            earlier, st.session_state.history_before_id = load_history_page(
+                st.session_state.session_id, st.session_state.history_before_id
+            )
+            st.session_state.display_history = earlier + st.session_state.display_history
+            st.rerun()
+
         chat_container = st.container()
         with chat_container:
             for query, response in st.session_state.display_history:
@@ -195,10 +208,15 @@ def main():
         elif input_mode == "Voice Input":
             recorded_audio = st.audio_input("Record your audio file")
             if recorded_audio is not None:
-                audio_processor = AudioProcessor()
-                query = audio_processor.transcribe_audio(audio_processor.save_audio(recorded_audio))
+                transcription = transcribe_recording(recorded_audio)
+                query = transcription["text"]
+                st.caption(f"🎙️ {query or '(no speech detected)'} — {transcription['audio_seconds']:.1f}s of audio "
+                           f"transcribed in {transcription['seconds']:.2f}s (RTF {transcription['rtf']:.2f})")
                 if st.button("Send", key="send_button"):
                     process_chat_input(query)
 
+    show_model_load_times()
+    show_cache_metrics()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+
+class ModelRegistry:
+    """Loads each shared resource lazily, exactly once per process.
+
+    Streamlit reruns the app script on every interaction and serves sessions from
+    several threads, so models kept in script-level variables are rebuilt over and
+    over. Resources fetched through the registry are built by the first caller; other
+    threads asking for the same name wait for that load instead of starting their own.
+    load_times records how long each load took, in seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._instances = {}
+        self.load_times = {}
+
+    def get(self, name, loader):
+        """Returns the resource registered under name, calling loader() on first use."""
+        # Fast path without locking once the resource exists
+        if name in self._instances:
+            return self._instances[name]
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(name, threading.Lock())
+
+        with key_lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                instance = loader()
+                self.load_times[name] = time.perf_counter() - start
+                self._instances[name] = instance
+        return self._instances[name]
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def evict(self, name):
+        """Forgets the resource registered under name, so the next get() loads it again."""
+        self._instances.pop(name, None)
+
+
+registry = ModelRegistry()
+
+
+def load_encoder(model_name="all-MiniLM-L6-v2", backend="torch", device=None, intra_op_threads=None, quantized=True):
+    """Builds a sentence encoder: a SentenceTransformer ("torch"), or the exported model on
+    ONNX Runtime ("onnx"), int8 unless quantized is False, exported to onnx_models/ the
+    first time it is asked for."""
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name, device=device)
+    if backend == "onnx":
+        from onnx_encoder import OnnxEncoder, default_model_dir, export_quantized_model
+        model_dir = default_model_dir(model_name)
+        if not os.path.exists(os.path.join(model_dir, "meta.json")):
+            export_quantized_model(model_name, model_dir)
+        return OnnxEncoder(model_dir, quantized=quantized, intra_op_threads=intra_op_threads)
+    raise ValueError(f"Unknown encoder backend: {backend}")
+
+
+def get_query_encoder(model_name="all-MiniLM-L6-v2", backend="torch"):
+    """Returns the shared encoder used to encode search queries.
+
+    Single queries are too small to keep many cores busy, so the ONNX encoder runs them
+    on at most four threads. It uses the float32 graph: short queries lose the most to
+    int8 weights, and at a few milliseconds per query there is little time to win back.
+    """
+    def load():
+        from onnx_encoder import default_threads
+        return load_encoder(model_name, backend, intra_op_threads=min(4, default_threads()), quantized=False)
+    key = f"query_encoder:{model_name}" if backend == "torch" else f"query_encoder:{backend}:{model_name}"
+    return registry.get(key, load)
+
+
+def get_chroma_client(db_path):
+    """Returns the shared Chroma client for a database directory."""
+    def load():
+        import chromadb
+        return chromadb.PersistentClient(path=db_path)
+    return registry.get(f"chroma_client:{db_path}", load)
+
+
+def get_asr_pipeline(model_name="openai/whisper-small"):
+    """Returns the shared Whisper speech recognition pipeline."""
+    def load():
+        import torch
+        from transformers import pipeline
+        return pipeline(
+            "automatic-speech-recognition",
+            model=model_name,
+            device=0 if torch.cuda.is_available() else -1,
+            generate_kwargs={"language": "en"}
+        )
+    return registry.get(f"asr:{model_name}", load)
@@ -0,0 +1,152 @@
+import json
+import os
+import re
+import numpy as np
+
+FP32_MODEL = "model.onnx"
+INT8_MODEL = "model_int8.onnx"
+
+
+def default_model_dir(model_name, root="./onnx_models"):
+    return os.path.join(root, re.sub(r"[^\w.-]+", "_", model_name))
+
+
+def default_threads():
+    """Cores this process may run on, which is what ONNX Runtime should use for intra-op work."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def export_quantized_model(model_name, model_dir, opset=14):
+    """Exports a SentenceTransformer to ONNX and writes an int8 copy next to it.
+
+    Pooling and normalization are part of the exported graph, so a session run returns
+    the same sentence embeddings as SentenceTransformer.encode(). The float32 graph is
+    fused with the BERT optimizer first (attention, layer norm and GELU), then the
+    weights of its MatMuls and attention projections are quantized to int8 with
+    per-channel scales. The tokenizer
+    and a meta.json describing the model are saved alongside.
+    """
+    import onnx
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.transformers.optimizer import optimize_model
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    # Eager attention exports to the MatMul/Softmax pattern the optimizer knows how to fuse
+    st_model = SentenceTransformer(model_name, device="cpu", model_kwargs={"attn_implementation": "eager"})
+    transformer = st_model[0].auto_model
+    pooling = next((module for module in st_model if isinstance(module, Pooling)), None)
+    # Newer sentence-transformers keep the mode as an attribute
+    mode = pooling and (getattr(pooling, "pooling_mode", None) or pooling.get_pooling_mode_str())
+    if mode != "mean":
+        raise ValueError(f"Only mean-pooled models can be exported, {model_name} is not one")
+    normalize = any(isinstance(module, Normalize) for module in st_model)
+
+    class PooledEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            hidden = self.transformer(input_ids=input_ids, attention_mask=attention_mask,
+                                      token_type_ids=token_type_ids)[0]
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            embeddings = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            return torch.nn.functional.normalize(embeddings, p=2, dim=1) if normalize else embeddings
+
+    os.makedirs(model_dir, exist_ok=True)
+    fp32_path = os.path.join(model_dir, FP32_MODEL)
+    int8_path = os.path.join(model_dir, INT8_MODEL)
+    sample = st_model.tokenizer(["an example subtitle line"], return_tensors="pt")
+    inputs = tuple(sample[name] for name in ("input_ids", "attention_mask", "token_type_ids"))
+    dynamic_axes = {name: {0: "batch", 1: "tokens"} for name in ("input_ids", "attention_mask", "token_type_ids")}
+    dynamic_axes["sentence_embedding"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            PooledEncoder().eval(), inputs, fp32_path, opset_version=opset, dynamo=False,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["sentence_embedding"], dynamic_axes=dynamic_axes
+        )
+
+    config = transformer.config
+    optimized = optimize_model(fp32_path, model_type="bert", num_heads=config.num_attention_heads,
+                               hidden_size=config.hidden_size)
+    optimized.save_model_to_file(fp32_path)
+    # Shape inference cannot type the fused contrib ops, so tell the quantizer they are float
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8, per_channel=True,
+                     op_types_to_quantize=["MatMul", "Attention"], extra_options={"DefaultTensorType": onnx.TensorProto.FLOAT})
+
+    st_model.tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, "meta.json"), "w") as f:
+        json.dump({
+            "model_name": model_name,
+            "max_seq_length": st_model.max_seq_length,
+            "dimension": st_model.get_sentence_embedding_dimension(),
+            "normalize": normalize,
+        }, f, indent=2)
+    print(f"✅ Exported {model_name} to {model_dir}")
+
+
+class OnnxEncoder:
+    """Encodes sentences with an exported model (see export_quantized_model) on ONNX Runtime.
+
+    A drop-in for the parts of SentenceTransformer the pipeline uses: encode() and
+    get_sentence_embedding_dimension(). quantized picks the int8 graph over the float32
+    one. intra_op_threads is the number of threads each session run may use; one thread
+    per core suits batch indexing, while a few threads are enough for single queries.
+    """
+
+    def __init__(self, model_dir, quantized=True, intra_op_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.max_seq_length = self.meta["max_seq_length"]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads or default_threads()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, INT8_MODEL if quantized else FP32_MODEL),
+            sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self):
+        return self.meta["dimension"]
+
+    def _run(self, sentences):
+        encodings = self.tokenizer.encode_batch(sentences)
+        feed = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        return self.session.run(None, {name: value for name, value in feed.items() if name in self.input_names})[0]
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        """Returns float32 embeddings, one row per sentence (a single vector for a str)."""
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Batch sentences of similar length together, as SentenceTransformer does
+        order = sorted(range(len(sentences)), key=lambda i: -len(sentences[i]))
+        embeddings = np.empty((len(sentences), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for i in range(0, len(order), batch_size):
+            batch = order[i:i + batch_size]
+            embeddings[batch] = self._run([sentences[j] for j in batch])
+
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings[0] if single else embeddings
@@ -1,28 +1,212 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
+import os
 import re
+import time
+from model_registry import get_chroma_client, get_query_encoder, registry
+from query_cache import LRUCache
+from vector_store import ChromaStore, open_store
 
 class SubtitleVectorDB:
-    def __init__(self, db_path):
-        self.chroma_client = chromadb.PersistentClient(path=db_path)
-        self.collection = self.chroma_client.get_or_create_collection(name="subtitles_collection")
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
+    def __init__(self, db_path, model_name="all-MiniLM-L6-v2", embedding_cache_size=1024, result_cache_size=256,
+                 result_ttl=300, version_check_interval=5, lexical_index_dir=None, rrf_k=60, backend="chroma",
+                 store_options=None, encoder_backend="torch"):
+        # The encoder and vector store are shared process-wide and loaded on first query
+        self.db_path = db_path
+        self.model_name = model_name
+        self.encoder_backend = encoder_backend  # "torch", or "onnx" for the int8 ONNX Runtime encoder
+        self.backend = backend
+        self.store_options = store_options or {}
+        # Optional BM25 index (see bm25_index.py) for hybrid search; rrf_k damps rank fusion
+        self.lexical_index_dir = lexical_index_dir
+        self.rrf_k = rrf_k
+
+        # Normalized query -> embedding; (embedding, top_k, overfetch, data version) -> titles
+        self.embedding_cache = LRUCache(maxsize=embedding_cache_size)
+        self.result_cache = LRUCache(maxsize=result_cache_size, ttl=result_ttl)
+        self.version_check_interval = version_check_interval
+        self._version = None
+        self._version_checked_at = float("-inf")
+
+    @property
+    def model(self):
+        return get_query_encoder(self.model_name, self.encoder_backend)
+
+    @property
+    def lexical_index(self):
+        from bm25_index import BM25Index
+        return registry.get(f"bm25_index:{self.lexical_index_dir}", lambda: BM25Index(self.lexical_index_dir))
+
+    def lexical_segments(self):
+        if not self.lexical_index_dir:
+            return ()
+        from bm25_index import segment_names
+        return segment_names(self.lexical_index_dir)
+
+    def has_lexical_index(self):
+        return bool(self.lexical_index_dir) and os.path.isdir(self.lexical_index_dir)
+
+    @property
+    def store(self):
+        def load():
+            if self.backend == "chroma":
+                return ChromaStore(self.db_path, client=get_chroma_client(self.db_path))
+            return open_store(self.backend, self.db_path, **self.store_options)
+        return registry.get(f"vector_store:{self.backend}:{self.db_path}", load)
+
+    def store_version(self):
+        """Returns the version of the data behind search results.
+
+        That is the version the ingest pipeline stamps on the vector store after each
+        write, paired with the lexical index's segment list. Re-read at most every
+        version_check_interval seconds; cached results are dropped as soon as either
+        changes, and a lexical index that gained a segment is reopened.
+        """
+        now = time.monotonic()
+        if now - self._version_checked_at >= self.version_check_interval:
+            version = (self.store.version(), self.lexical_segments())
+            if version != self._version:
+                self.result_cache.clear()
+                if self._version is not None and version[1] != self._version[1]:
+                    registry.evict(f"bm25_index:{self.lexical_index_dir}")
+                self._version = version
+            self._version_checked_at = now
+        return self._version
+
+    def clear_caches(self):
+        self.embedding_cache.clear()
+        self.result_cache.clear()
+        self._version_checked_at = float("-inf")
+
+    def cache_metrics(self):
+        return {"embedding": self.embedding_cache.metrics(), "results": self.result_cache.metrics()}
+
+    @staticmethod
+    def normalize_query(query):
+        return " ".join(query.lower().split())
+
+    def encode_queries(self, queries):
+        """Encodes queries in one model call, reusing embeddings of earlier queries that normalize the same."""
+        keys = [self.normalize_query(query) for query in queries]
+        embeddings = [self.embedding_cache.get(key) for key in keys]
+
+        missing = list(dict.fromkeys(key for key, embedding in zip(keys, embeddings) if embedding is None))
+        if missing:
+            # Encode the normalized text so every query sharing a key gets the same vector
+            encoded = dict(zip(missing, self.model.encode(missing, convert_to_numpy=True)))
+            for key, embedding in encoded.items():
+                self.embedding_cache.put(key, embedding)
+            embeddings = [encoded[key] if embedding is None else embedding for key, embedding in zip(keys, embeddings)]
+        return embeddings
+
+    def encode_query(self, query):
+        return self.encode_queries([query])[0]
 
     def extract_movie_name(self, filename):
         """Extracts a clean movie name from the subtitle filename."""
         cleaned_name = re.sub(r"(\.s\d{2}|\.\d{3}|\(\d{4}\).*|\.eng.*)", "", filename, flags=re.IGNORECASE)
         return cleaned_name.replace(".", " ").strip().title()
 
-    def query_subtitles(self, query, top_k=5):
-        """Queries the vector database and returns movie names, subtitles, and similarity scores."""
-        query_embedding = self.model.encode(query, convert_to_numpy=True).tolist()
-        results = self.collection.query(query_embeddings=[query_embedding], n_results=top_k)
-        
-        output = []
-        for i in range(len(results["documents"][0])):
-            raw_movie_name = results["metadatas"][0][i]["name"]
-            cleaned_movie_name = self.extract_movie_name(raw_movie_name)
-            score = results["distances"][0][i]
-            output.append((cleaned_movie_name, score))
-        
-        return output
\ No newline at end of file
+    def aggregate_titles(self, ids, metadatas, distances, top_k, max_timestamps=3):
+        """Groups chunk hits by subtitle, scoring each title by its closest chunk.
+
+        Returns up to top_k (movie name, score, timestamps) tuples, where score is the
+        cosine similarity of the closest chunk (higher is better) and timestamps lists
+        the (start, end) seconds of the title's best-matching chunks.
+        """
+        return list(self.group_hits(ids, metadatas, distances, top_k, max_timestamps).values())
+
+    def group_hits(self, ids, metadatas, distances, top_k, max_timestamps=3):
+        """Like aggregate_titles, but returns the ranked titles keyed by num."""
+        titles = {}
+        for chunk_id, metadata, distance in zip(ids, metadatas, distances):
+            # Whole-file entries from older builds carry no num, their id is the num
+            key = metadata.get("num", chunk_id)
+            if key not in titles:
+                if len(titles) == top_k:
+                    continue
+                # Distances are squared L2 between unit vectors, 2 - 2 * cosine
+                titles[key] = (self.extract_movie_name(metadata["name"]), 1 - distance / 2, [])
+            timestamps = titles[key][2]
+            if metadata.get("start", -1.0) >= 0 and len(timestamps) < max_timestamps:
+                timestamps.append((metadata["start"], metadata["end"]))
+
+        # Hits arrive closest first, so insertion order is already ranked by each title's best chunk
+        return titles
+
+    def lexical_titles(self, query, top_k, overfetch=10, max_timestamps=3):
+        """Runs query against the BM25 index and groups the hits by subtitle, best first, keyed by num."""
+        titles = {}
+        for num, name, start, end, score in self.lexical_index.search(query, top_k * overfetch):
+            if num not in titles:
+                if len(titles) == top_k:
+                    continue
+                titles[num] = (self.extract_movie_name(name), score, [])
+            timestamps = titles[num][2]
+            if start >= 0 and len(timestamps) < max_timestamps:
+                timestamps.append((start, end))
+        return titles
+
+    def fuse_titles(self, rankings, top_k, max_timestamps=3):
+        """Merges ranked {num: (name, score, timestamps)} dicts with reciprocal rank fusion.
+
+        Each title scores sum(1 / (rrf_k + rank)) over the rankings it appears in, scaled
+        so that first place in every ranking is 1.0. Timestamps are merged in ranking order.
+        """
+        fused = {}
+        for ranking in rankings:
+            for rank, (key, (name, _, timestamps)) in enumerate(ranking.items(), start=1):
+                entry = fused.setdefault(key, [name, 0.0, []])
+                entry[1] += 1 / (self.rrf_k + rank)
+                for span in timestamps:
+                    if span not in entry[2] and len(entry[2]) < max_timestamps:
+                        entry[2].append(span)
+
+        best = len(rankings) / (self.rrf_k + 1)
+        ranked = sorted(fused.values(), key=lambda entry: -entry[1])[:top_k]
+        return [(name, score / best, timestamps) for name, score, timestamps in ranked]
+
+    def query_subtitles(self, query, top_k=5, overfetch=10, hybrid=False):
+        """Queries the vector database and returns movie names, similarity scores and matching timestamps.
+
+        Fetches top_k * overfetch chunks so that several chunks of one film do not crowd
+        the others out of the top_k titles. With hybrid, the vector ranking is fused with
+        a BM25 ranking from the lexical index, which catches exact quotes. Scores are
+        higher-is-better in both modes: the cosine similarity of each title's closest
+        chunk, or with hybrid the fused rank score, where 1.0 is first in both rankings.
+        """
+        return self.query_subtitles_batch([query], top_k, overfetch, hybrid)[0]
+
+    def query_subtitles_batch(self, queries, top_k=5, overfetch=10, hybrid=False):
+        """Runs several queries with one encoder call and one vector store query.
+
+        Returns one list per query, in order, each shaped like query_subtitles' result.
+        """
+        version = self.store_version()
+        embeddings = self.encode_queries(queries)
+        texts = [self.normalize_query(query) for query in queries]
+        # Lexical results depend on the words, not just the embedding
+        cache_keys = [
+            (embedding.tobytes(), top_k, overfetch, version) + ((text,) if hybrid else ())
+            for embedding, text in zip(embeddings, texts)
+        ]
+        results = [self.result_cache.get(key) for key in cache_keys]
+
+        # Queries repeated within the batch are searched once
+        pending = {}
+        for key, embedding, text, titles in zip(cache_keys, embeddings, texts, results):
+            if titles is None:
+                pending.setdefault(key, (embedding, text))
+
+        if pending:
+            hits = self.store.query([embedding for embedding, _ in pending.values()], top_k * overfetch)
+            # Fusion ranks deeper lists so a title strong in only one ranking can still surface
+            depth = 2 * top_k if hybrid else top_k
+            for i, (key, (_, text)) in enumerate(list(pending.items())):
+                vector_titles = self.group_hits(hits["ids"][i], hits["metadatas"][i], hits["distances"][i], depth)
+                if hybrid:
+                    titles = self.fuse_titles([self.lexical_titles(text, depth, overfetch), vector_titles], top_k)
+                else:
+                    titles = list(vector_titles.values())
+                pending[key] = titles
+                self.result_cache.put(key, titles)
+
+        return [list(pending[key] if titles is None else titles) for key, titles in zip(cache_keys, results)]
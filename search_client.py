@@ -0,0 +1,44 @@
+import time
+import httpx
+
+
+class SearchClient:
+    """Calls a running search_service.py with the same interface as SubtitleVectorDB.
+
+    Offers the methods main.py uses (query_subtitles, has_lexical_index and
+    cache_metrics) over one pooled HTTP connection, so the app can hand searches to a
+    shared, warm service instead of loading the models in every Streamlit process.
+    """
+
+    def __init__(self, base_url="http://127.0.0.1:8000", timeout=10.0, health_check_interval=30):
+        self.client = httpx.Client(base_url=base_url, timeout=timeout)
+        self.health_check_interval = health_check_interval
+        self._lexical_index = False
+        self._health_checked_at = float("-inf")
+
+    def query_subtitles(self, query, top_k=5, overfetch=10, hybrid=False):
+        response = self.client.post("/query", json={"query": query, "top_k": top_k, "overfetch": overfetch,
+                                                     "hybrid": hybrid})
+        response.raise_for_status()
+        return [
+            (name, score, [tuple(span) for span in timestamps])
+            for name, score, timestamps in response.json()["results"]
+        ]
+
+    def has_lexical_index(self):
+        """Whether the service has a lexical index; /health is asked at most every health_check_interval seconds."""
+        now = time.monotonic()
+        if now - self._health_checked_at >= self.health_check_interval:
+            response = self.client.get("/health")
+            response.raise_for_status()
+            self._lexical_index = response.json()["lexical_index"]
+            self._health_checked_at = now
+        return self._lexical_index
+
+    def cache_metrics(self):
+        response = self.client.get("/metrics")
+        response.raise_for_status()
+        return response.json()["caches"]
+
+    def close(self):
+        self.client.close()
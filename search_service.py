@@ -0,0 +1,167 @@
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import uvicorn
+from fastapi import FastAPI
+from pydantic import BaseModel
+from model_registry import registry
+from query_extraction import SubtitleVectorDB
+
+
+class QueryRequest(BaseModel):
+    query: str
+    top_k: int = 5
+    overfetch: int = 10
+    hybrid: bool = False
+
+
+class MicroBatcher:
+    """Gathers concurrent queries into query_subtitles_batch calls.
+
+    A batch closes once max_batch_size queries are waiting or its oldest query has
+    waited max_wait_ms, so batching adds at most that much latency. Batches run one at
+    a time on a single worker thread, which keeps the encoder to one caller; queries
+    that arrive meanwhile are gathered into the next batch. Queries with different
+    top_k, overfetch or hybrid settings are searched in separate calls. With the
+    default max_wait_ms=0 a lone query never waits, and batches only form from queries
+    that arrived while the previous batch ran. That keeps single-client throughput at
+    the unbatched level; a positive wait only pays off under steady concurrent load.
+    """
+
+    def __init__(self, db, max_batch_size=32, max_wait_ms=0):
+        self.db = db
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self.batch_sizes = Counter()
+        self._pending = []  # (request, future, arrived_at)
+        self._arrived = None
+        self._task = None
+
+    async def start(self):
+        self._arrived = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self.executor.shutdown()
+
+    async def run_in_worker(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def submit(self, request):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((request, future, loop.time()))
+        self._arrived.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._arrived.wait()
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch_size and loop.time() < deadline:
+                self._arrived.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._arrived.wait(), deadline - loop.time())
+
+            batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+            if not self._pending:
+                self._arrived.clear()
+            self.batch_sizes[len(batch)] += 1
+            await self._execute(batch)
+
+    async def _execute(self, batch):
+        groups = {}
+        for request, future, _ in batch:
+            groups.setdefault((request.top_k, request.overfetch, request.hybrid), []).append((request, future))
+
+        for (top_k, overfetch, hybrid), entries in groups.items():
+            queries = [request.query for request, _ in entries]
+            try:
+                results = await self.run_in_worker(self.db.query_subtitles_batch, queries, top_k, overfetch, hybrid)
+            except Exception as e:
+                results = [e] * len(entries)
+            for (_, future), result in zip(entries, results):
+                # The client may have disconnected and cancelled its request
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+def create_app(db, max_batch_size=32, max_wait_ms=0):
+    """Builds the search API around a SubtitleVectorDB, warming its models on startup."""
+    batcher = MicroBatcher(db, max_batch_size, max_wait_ms)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        await batcher.start()
+        # Load the encoder, vector store and lexical index before the first request does
+        try:
+            await batcher.run_in_worker(db.query_subtitles_batch, ["warm up"], 1, 1, db.has_lexical_index())
+            print("🔥 Search models loaded.")
+        except Exception as e:
+            print(f"⚠️ Warm-up query failed: {e}")
+        yield
+        await batcher.stop()
+
+    app = FastAPI(title="Subtitle search", lifespan=lifespan)
+
+    @app.post("/query")
+    async def query(request: QueryRequest):
+        titles = await batcher.submit(request)
+        return {"results": [(name, float(score), timestamps) for name, score, timestamps in titles]}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "lexical_index": db.has_lexical_index()}
+
+    @app.get("/metrics")
+    async def metrics():
+        return {
+            "batch_sizes": dict(sorted(batcher.batch_sizes.items())),
+            "caches": db.cache_metrics(),
+            "load_times": registry.load_times,
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves subtitle search over HTTP with warm models and micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32, help="Most queries searched in one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=0, help="Longest a query waits for its batch to fill")
+    parser.add_argument("--backend", default=os.getenv("VECTOR_BACKEND", "chroma"), help="chroma or numpy")
+    parser.add_argument("--db-path", help="Vector store path (defaults to ./chroma_db or ./numpy_store)")
+    parser.add_argument("--encoder-backend", default=os.getenv("ENCODER_BACKEND", "torch"), help="torch or onnx")
+    parser.add_argument("--model-name", default="all-MiniLM-L6-v2")
+    parser.add_argument("--lexical-index-dir", default="./lexical_index")
+    args = parser.parse_args()
+
+    db = SubtitleVectorDB(
+        db_path=args.db_path or ("./chroma_db" if args.backend == "chroma" else "./numpy_store"),
+        model_name=args.model_name,
+        lexical_index_dir=args.lexical_index_dir,
+        backend=args.backend,
+        encoder_backend=args.encoder_backend
+    )
+    # One process, so every request shares the same warm models and caches
+    uvicorn.run(create_app(db, args.max_batch_size, args.max_wait_ms), host=args.host, port=args.port,
+                log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
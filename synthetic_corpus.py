@@ -0,0 +1,145 @@
+import argparse
+import io
+import os
+import random
+import sqlite3
+import sys
+import zipfile
+
+WORDS = ("the a you i to it and what is that we in me this of he don't know no for on have be your "
+         "just was my not with are all do there get here can go she right come out now like they "
+         "about want up got him so think let's look time back tell one how good see man well where "
+         "never them would take why who gonna need little over something night really talk money "
+         "café déjà vu naïve señor fiancée résumé").split()
+QUOTES = [
+    "I'll be back.",
+    "You talking to me?",
+    "Here's looking at you, kid.",
+    "May the Force be with you.",
+    "We're gonna need a bigger boat.",
+    "There's no place like home.",
+    "Show me the money!",
+    "I see dead people.",
+    "You can't handle the truth!",
+    "Houston, we have a problem.",
+]
+TITLES = ("the night shift", "a long way home", "dead reckoning", "the money talk", "little big man",
+          "back to the harbor", "the last boat", "no place like it", "summer of the kid", "the truth machine")
+# The kinds of lines the cleaner strips, as they appear in OpenSubtitles downloads
+BOILERPLATE = [
+    "Support us and become VIP member",
+    "to remove all ads from www.OpenSubtitles.org",
+    "-== [ www.OpenSubtitles.com ] ==-",
+    "Advertise your product or brand here",
+    "contact www.OpenSubtitles.org today",
+    "please rate this subtitle at www.osdb.link/b4x9z",
+    "help other users to choose the best subtitles",
+    "api.OpenSubtitles.org is deprecated, please implement REST API from OpenSubtitles.com",
+    "~ subtitles started by kevin ~",
+]
+# (encoding, weight): BOM-less legacy code pages send the extractor down its chardet path
+ENCODINGS = [("utf-8", 0.6), ("utf-8-sig", 0.1), ("utf-16", 0.1), ("cp1252", 0.2)]
+ASS_HEADER = ("[Script Info]\nTitle: {title}\nScriptType: v4.00+\n\n[V4+ Styles]\n"
+              "Format: Name, Fontname, Fontsize\nStyle: Default,Arial,20\n\n[Events]\n"
+              "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n")
+
+
+def _srt_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(secs):02d},{int(secs % 1 * 1000):03d}"
+
+
+def _ass_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours)}:{int(minutes):02d}:{int(secs):02d}.{int(secs % 1 * 100):02d}"
+
+
+def subtitle_document(rng, title, cues=300, ass=False, boilerplate_ratio=0.5):
+    """Builds one SRT or ASS file of cues lines, with boilerplate at either end now and then."""
+    lines = []
+    for _ in range(cues):
+        if rng.random() < 0.02:
+            line = rng.choice(QUOTES)
+        else:
+            line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))).capitalize() + rng.choice(".?!")
+        lines.append(line)
+    if rng.random() < boilerplate_ratio:
+        lines.insert(0, rng.choice(BOILERPLATE))
+    if rng.random() < boilerplate_ratio:
+        lines.append(rng.choice(BOILERPLATE))
+
+    parts, clock = [ASS_HEADER.format(title=title)] if ass else [], rng.uniform(1, 60)
+    for i, line in enumerate(lines):
+        start, end = clock, clock + rng.uniform(1, 4)
+        clock = end + rng.uniform(0.2, 6)
+        if ass:
+            styled = "{\\an8}" + line if rng.random() < 0.1 else line
+            parts.append(f"Dialogue: 0,{_ass_time(start)},{_ass_time(end)},Default,,0,0,0,,{styled}\n")
+        else:
+            styled = f"<i>{line}</i>" if rng.random() < 0.1 else line
+            parts.append(f"{i + 1}\n{_srt_time(start)} --> {_srt_time(end)}\n{styled}\n\n")
+    return "".join(parts)
+
+
+def zip_payload(name, text, encoding):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr(name, text.encode(encoding, errors="replace"))
+    return buffer.getvalue()
+
+
+def generate_zipfiles_db(db_path, rows, seed=0, cues=300, ass_ratio=0.25, boilerplate_ratio=0.5,
+                         invalid_ratio=0.002, batch_size=500):
+    """Writes a zipfiles table shaped like eng_subtitles_database.db with rows synthetic subtitles.
+
+    Each row is (num, name, content): a ZIP holding one SRT file (or ASS, for ass_ratio
+    of rows) in one of ENCODINGS, with OpenSubtitles boilerplate injected into
+    boilerplate_ratio of files and invalid_ratio of blobs not being ZIPs at all. The
+    same seed always produces the same database. Returns the total content size in bytes.
+    """
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    rng = random.Random(seed)
+    encodings, weights = zip(*ENCODINGS)
+    conn = sqlite3.connect(db_path)
+    total_bytes = 0
+    try:
+        conn.execute("CREATE TABLE zipfiles (num INTEGER PRIMARY KEY, name TEXT, content BLOB)")
+        for batch_start in range(0, rows, batch_size):
+            batch = []
+            for num in range(batch_start + 1, min(batch_start + batch_size, rows) + 1):
+                title = rng.choice(TITLES)
+                name = f"{title.replace(' ', '.')}.({rng.randint(1950, 2024)}).eng.1cd"
+                if rng.random() < invalid_ratio:
+                    content = b"not a zip archive"
+                else:
+                    ass = rng.random() < ass_ratio
+                    text = subtitle_document(rng, title, cues, ass, boilerplate_ratio)
+                    encoding = rng.choices(encodings, weights)[0]
+                    content = zip_payload(f"{name}.{'ass' if ass else 'srt'}", text, encoding)
+                total_bytes += len(content)
+                batch.append((num * 10 + rng.randint(0, 9), name, content))
+            conn.executemany("INSERT INTO zipfiles (num, name, content) VALUES (?, ?, ?)", batch)
+            conn.commit()
+    finally:
+        conn.close()
+    return total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates a synthetic zipfiles subtitle database.")
+    parser.add_argument("output", help="SQLite file to write (replaced if it exists)")
+    parser.add_argument("--rows", type=int, default=10_000, help="Number of subtitle files")
+    parser.add_argument("--cues", type=int, default=300, help="Dialogue lines per file")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    total_bytes = generate_zipfiles_db(args.output, args.rows, args.seed, args.cues)
+    print(f"✅ Wrote {args.rows} subtitles ({total_bytes / 1024 ** 2:.1f} MB of ZIP content) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,442 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+COLLECTION_NAME = "subtitles_collection"
+
+
+def open_store(backend, path, **options):
+    """Opens the vector store named by backend ("chroma" or "numpy") at path."""
+    if backend == "chroma":
+        return ChromaStore(path, **options)
+    if backend == "numpy":
+        return NumpyStore(path, **options)
+    raise ValueError(f"Unknown vector store backend: {backend!r}")
+
+
+class ChromaStore:
+    """Vector store backed by a persistent Chroma collection.
+
+    All stores share this interface: upsert, delete, query, count, version,
+    mark_updated and optimize. query returns Chroma's result shape (lists of ids,
+    metadatas and distances per query embedding), with squared L2 distances.
+    """
+
+    def __init__(self, db_path, client=None, collection_name=COLLECTION_NAME):
+        if client is None:
+            import chromadb
+            client = chromadb.PersistentClient(path=db_path)
+        self.client = client
+        self.collection_name = collection_name
+        self.collection = client.get_or_create_collection(name=collection_name)
+
+    def upsert(self, ids, embeddings, metadatas, documents=None):
+        # Chroma rejects writes larger than its maximum batch size
+        step = self.client.get_max_batch_size() if hasattr(self.client, "get_max_batch_size") else 5000
+        for i in range(0, len(ids), step):
+            self.collection.upsert(
+                ids=list(ids[i:i + step]),
+                embeddings=np.asarray(embeddings[i:i + step]).tolist(),
+                metadatas=list(metadatas[i:i + step]),
+                documents=list(documents[i:i + step]) if documents is not None else None
+            )
+
+    def delete(self, ids=None, nums=None):
+        """Deletes entries by id and/or every entry whose metadata num is in nums."""
+        if ids:
+            self.collection.delete(ids=list(ids))
+        if nums:
+            self.collection.delete(where={"num": {"$in": [int(num) for num in nums]}})
+
+    def query(self, embeddings, n_results):
+        results = self.collection.query(
+            query_embeddings=[np.asarray(embedding).tolist() for embedding in embeddings],
+            n_results=n_results,
+            include=["metadatas", "distances"]
+        )
+        return {"ids": results["ids"], "metadatas": results["metadatas"], "distances": results["distances"]}
+
+    def count(self):
+        return self.collection.count()
+
+    def mark_updated(self):
+        """Stamps a new index_version so running search apps drop cached results."""
+        self.collection.modify(metadata={"index_version": time.time_ns()})
+
+    def version(self):
+        # Re-fetched, since a rebuild may have replaced the collection itself
+        self.collection = self.client.get_or_create_collection(name=self.collection_name)
+        return (self.collection.metadata or {}).get("index_version")
+
+    def optimize(self):
+        """Chroma maintains its HNSW index as it goes; nothing to do."""
+
+
+def _write_at(path, offset, data):
+    """Writes data at offset, first cutting off anything a crashed write left past it."""
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(data)
+
+
+class NumpyStore:
+    """Vector store kept in memory-mapped NumPy files and searched with matrix products.
+
+    Vectors are normalized and appended to vectors.bin as float32 rows, or as int8 rows
+    with a float32 scale each in scales.bin when quantize is set (a quarter of the
+    memory, at a small cost in precision). live.bin marks rows still in use; upserts
+    append a new row and retire the old one, and compact() reclaims retired rows.
+    Ids, metadata and documents live in entries.db.
+
+    Queries scan every live row in blocks of block_rows, small enough for int8 rows to be
+    widened to float32 in cache. After build_ivf(), they only score the nprobe inverted
+    lists whose k-means centroids are closest to the query, plus rows added since the
+    lists were built. Distances are squared L2 between unit
+    vectors (2 - 2 * cosine), the same as Chroma's default space.
+    """
+
+    def __init__(self, store_dir, quantize=False, nlist=None, nprobe=16, block_rows=8192):
+        self.store_dir = store_dir
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.block_rows = block_rows
+        os.makedirs(store_dir, exist_ok=True)
+
+        # Shared by Streamlit's session threads, so access goes through a lock
+        self.conn = sqlite3.connect(os.path.join(store_dir, "entries.db"), check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock, self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS entries (
+                                 id TEXT PRIMARY KEY, row INTEGER, num INTEGER, metadata TEXT, document TEXT)''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_row ON entries (row)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS entries_num ON entries (num)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+
+        # The element type is fixed by the first write
+        self.dtype = np.dtype(self._info("dtype") or (np.int8 if quantize else np.float32))
+        self.dim = int(self._info("dim") or 0)
+
+        self._rows = -1
+        self._compacted = None
+        self._vectors = self._scales = self._live = None
+        self._ivf_version = None
+        self._ivf = None
+
+    def _path(self, name):
+        return os.path.join(self.store_dir, name)
+
+    def _info(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, **values):
+        self.conn.executemany("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+                              [(key, str(value)) for key, value in values.items()])
+
+    def _rows_where(self, column, values):
+        rows = []
+        values = list(values)
+        # Stay below SQLite's bound-parameter limit
+        for i in range(0, len(values), 900):
+            part = values[i:i + 900]
+            placeholders = ",".join("?" * len(part))
+            rows += [row for row, in self.conn.execute(
+                f"SELECT row FROM entries WHERE {column} IN ({placeholders})", part)]
+        return rows
+
+    def _encode(self, embeddings):
+        if self.dtype == np.int8:
+            scales = np.maximum(np.abs(embeddings).max(axis=1), 1e-12) / 127
+            return np.round(embeddings / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+        return embeddings.astype(np.float32), None
+
+    def _retire(self, rows):
+        if rows:
+            live = np.memmap(self._path("live.bin"), dtype=np.uint8, mode="r+")
+            live[np.asarray(rows, dtype=np.int64)] = 0
+            live.flush()
+            del live
+
+    def upsert(self, ids, embeddings, metadatas, documents=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if not len(ids):
+            return
+        embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+        with self.lock:
+            if not self.dim:
+                self.dim = embeddings.shape[1]
+                with self.conn:
+                    self._set_info(dim=self.dim, dtype=self.dtype.name)
+
+            rows = int(self._info("rows") or 0)
+            encoded, scales = self._encode(embeddings)
+            # Vectors reach disk before the entries that point at them are committed
+            _write_at(self._path("vectors.bin"), rows * self.dim * self.dtype.itemsize, encoded.tobytes())
+            if scales is not None:
+                _write_at(self._path("scales.bin"), rows * 4, scales.tobytes())
+            _write_at(self._path("live.bin"), rows, np.ones(len(ids), dtype=np.uint8).tobytes())
+
+            old_rows = self._rows_where("id", ids)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO entries (id, row, num, metadata, document) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (entry_id, rows + i, metadata.get("num"), json.dumps(metadata),
+                         documents[i] if documents is not None else None)
+                        for i, (entry_id, metadata) in enumerate(zip(ids, metadatas))
+                    ]
+                )
+                self._set_info(rows=rows + len(ids))
+            # Rows retired after the commit: a crash in between only leaves orphans, never gaps
+            self._retire(old_rows)
+
+    def delete(self, ids=None, nums=None):
+        """Deletes entries by id and/or every entry whose metadata num is in nums."""
+        with self.lock:
+            rows = (self._rows_where("id", ids) if ids else []) + \
+                   (self._rows_where("num", [int(num) for num in nums]) if nums else [])
+            if not rows:
+                return
+            with self.conn:
+                for i in range(0, len(rows), 900):
+                    part = rows[i:i + 900]
+                    self.conn.execute(f"DELETE FROM entries WHERE row IN ({','.join('?' * len(part))})", part)
+            self._retire(rows)
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def mark_updated(self):
+        with self.lock, self.conn:
+            self._set_info(version=time.time_ns())
+
+    def version(self):
+        return self._info("version")
+
+    def _refresh(self):
+        """Re-maps the files after another process (or thread) has appended or rebuilt them."""
+        # Read together, so a compaction committed in between cannot pair new files with an old row count
+        with self.lock:
+            info = dict(self.conn.execute("SELECT key, value FROM info WHERE key IN ('rows', 'compacted')"))
+        rows, compacted = int(info.get("rows") or 0), info.get("compacted")
+        # compact() renumbers rows, so its files are remapped even when the row count comes back the same
+        if rows != self._rows or compacted != self._compacted:
+            self._rows, self._compacted = rows, compacted
+            if rows and not self.dim:
+                # Opened before the first write: take the shape and type the writer fixed
+                self.dim, self.dtype = int(self._info("dim")), np.dtype(self._info("dtype"))
+            self._vectors = self._scales = self._live = None
+            if rows:
+                # Read-only shared mappings, so retirements by a writer show up immediately
+                self._vectors = np.memmap(self._path("vectors.bin"), dtype=self.dtype, mode="r", shape=(rows, self.dim))
+                self._live = np.memmap(self._path("live.bin"), dtype=np.uint8, mode="r", shape=(rows,))
+                if self.dtype == np.int8:
+                    self._scales = np.memmap(self._path("scales.bin"), dtype=np.float32, mode="r", shape=(rows,))
+
+        ivf_version = self._info("ivf_version")
+        if ivf_version != self._ivf_version:
+            self._ivf_version = ivf_version
+            self._ivf = None
+            if ivf_version is not None:
+                self._ivf = (np.load(self._path("ivf_centroids.npy")), np.load(self._path("ivf_rows.npy")),
+                             np.load(self._path("ivf_offsets.npy")), int(self._info("ivf_covered")))
+
+    def _scores(self, index, queries):
+        """Returns inner products between the rows at index (a slice or row array) and each query."""
+        vectors = self._vectors[index]
+        if self.dtype == np.int8:
+            return (vectors.astype(np.float32) @ queries.T) * self._scales[index][:, None]
+        return vectors @ queries.T
+
+    def _exact(self, queries, n_results):
+        best_scores = np.empty((0, len(queries)), dtype=np.float32)
+        best_rows = np.empty((0, len(queries)), dtype=np.int64)
+        for start in range(0, self._rows, self.block_rows):
+            end = min(start + self.block_rows, self._rows)
+            scores = self._scores(slice(start, end), queries)
+            scores[self._live[start:end] == 0] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end)[:, None], scores.shape)
+
+            scores = np.vstack([best_scores, scores])
+            rows = np.vstack([best_rows, rows])
+            if len(scores) > n_results:
+                keep = np.argpartition(-scores, n_results - 1, axis=0)[:n_results]
+                scores = np.take_along_axis(scores, keep, axis=0)
+                rows = np.take_along_axis(rows, keep, axis=0)
+            best_scores, best_rows = scores, rows
+
+        return [(best_rows[:, j], best_scores[:, j]) for j in range(len(queries))]
+
+    def _probe(self, queries, n_results):
+        centroids, list_rows, offsets, covered = self._ivf
+        nprobe = min(self.nprobe, len(centroids))
+        probes = np.argpartition(-(queries @ centroids.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        results = []
+        for query, lists in zip(queries, probes):
+            # Rows added since the lists were built are always scanned
+            candidates = np.concatenate([list_rows[offsets[l]:offsets[l + 1]] for l in lists]
+                                        + [np.arange(covered, self._rows)])
+            candidates = np.sort(candidates)
+            candidates = candidates[self._live[candidates] != 0]
+            scores = self._scores(candidates, query[None, :])[:, 0]
+            if len(scores) > n_results:
+                keep = np.argpartition(-scores, n_results - 1)[:n_results]
+                candidates, scores = candidates[keep], scores[keep]
+            results.append((candidates, scores))
+        return results
+
+    def query(self, embeddings, n_results):
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with self.lock:
+            self._refresh()
+            if not self._rows:
+                return {"ids": [[] for _ in queries], "metadatas": [[] for _ in queries], "distances": [[] for _ in queries]}
+            hits = self._probe(queries, n_results) if self._ivf is not None else self._exact(queries, n_results)
+
+            wanted = sorted({int(row) for rows, scores in hits for row, score in zip(rows, scores) if np.isfinite(score)})
+            entries = {}
+            for i in range(0, len(wanted), 900):
+                part = wanted[i:i + 900]
+                for row, entry_id, metadata in self.conn.execute(
+                    f"SELECT row, id, metadata FROM entries WHERE row IN ({','.join('?' * len(part))})", part
+                ):
+                    entries[row] = (entry_id, json.loads(metadata))
+
+        results = {"ids": [], "metadatas": [], "distances": []}
+        for rows, scores in hits:
+            order = np.argsort(-scores, kind="stable")
+            # Rows without an entry were orphaned by an interrupted write
+            ranked = [(entries[int(rows[i])], float(scores[i])) for i in order
+                      if np.isfinite(scores[i]) and int(rows[i]) in entries]
+            results["ids"].append([entry_id for (entry_id, _), _ in ranked])
+            results["metadatas"].append([metadata for (_, metadata), _ in ranked])
+            results["distances"].append([max(0.0, 2.0 - 2.0 * score) for _, score in ranked])
+        return results
+
+    def build_ivf(self, nlist=None, iterations=10, sample_size=None, seed=0):
+        """Clusters the live vectors with spherical k-means and writes one inverted list per cluster.
+
+        nlist defaults to 4 * sqrt(vectors); k-means trains on sample_size vectors (by
+        default 40 per list, enough for stable centroids).
+        """
+        start = time.perf_counter()
+        with self.lock:
+            self._refresh()
+            live_rows = np.flatnonzero(self._live) if self._rows else np.empty(0, dtype=np.int64)
+            if not len(live_rows):
+                return
+            nlist = min(nlist or self.nlist or int(4 * np.sqrt(len(live_rows))), len(live_rows))
+
+            def dequantize(index):
+                vectors = self._vectors[index].astype(np.float32)
+                return vectors * self._scales[index][:, None] if self.dtype == np.int8 else vectors
+
+            def assign(vectors, centroids):
+                labels = np.empty(len(vectors), dtype=np.int64)
+                for i in range(0, len(vectors), 4096):
+                    labels[i:i + 4096] = np.argmax(vectors[i:i + 4096] @ centroids.T, axis=1)
+                return labels
+
+            rng = np.random.default_rng(seed)
+            sample_size = min(sample_size or 40 * nlist, len(live_rows))
+            sample = dequantize(np.sort(rng.choice(live_rows, sample_size, replace=False)))
+            centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+            for _ in range(iterations):
+                labels = assign(sample, centroids)
+                counts = np.bincount(labels, minlength=nlist)
+                starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+                sums = np.zeros_like(centroids)
+                sums[counts > 0] = np.add.reduceat(sample[np.argsort(labels, kind="stable")], starts[counts > 0])
+                # Reseed empty clusters from random sample points
+                empty = counts == 0
+                sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+                centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+            labels = np.concatenate([
+                assign(dequantize(live_rows[i:i + self.block_rows]), centroids)
+                for i in range(0, len(live_rows), self.block_rows)
+            ])
+            order = np.argsort(labels, kind="stable")
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=nlist))])
+
+            for name, array in (("ivf_centroids", centroids.astype(np.float32)), ("ivf_rows", live_rows[order]),
+                                ("ivf_offsets", offsets)):
+                np.save(self._path(f"{name}.tmp.npy"), array)
+                os.replace(self._path(f"{name}.tmp.npy"), self._path(f"{name}.npy"))
+            with self.conn:
+                self._set_info(ivf_covered=self._rows, ivf_version=time.time_ns())
+
+        print(f"✅ Built IVF index: {nlist} lists over {len(live_rows)} vectors in {time.perf_counter() - start:.1f}s")
+
+    def compact(self):
+        """Rewrites the files without retired rows and renumbers the entries.
+
+        Each compaction records a new generation in info; search processes that have the
+        store open remap the new files on their next query.
+        """
+        with self.lock:
+            self._refresh()
+            if not self._rows:
+                return 0
+            live_rows = np.flatnonzero(self._live)
+            retired = self._rows - len(live_rows)
+            if not retired:
+                return 0
+
+            for name, array in (("vectors", self._vectors), ("scales", self._scales)):
+                if array is not None:
+                    with open(self._path(f"{name}.tmp"), "wb") as f:
+                        for i in range(0, len(live_rows), self.block_rows):
+                            f.write(np.ascontiguousarray(array[live_rows[i:i + self.block_rows]]).tobytes())
+            with open(self._path("live.tmp"), "wb") as f:
+                f.write(np.ones(len(live_rows), dtype=np.uint8).tobytes())
+
+            # Drop the mappings before replacing the files, otherwise Windows keeps them locked
+            self._vectors = self._scales = self._live = None
+            self._rows = -1
+            for name in ("vectors", "scales", "live"):
+                if os.path.exists(self._path(f"{name}.tmp")):
+                    os.replace(self._path(f"{name}.tmp"), self._path(f"{name}.bin"))
+
+            with self.conn:
+                self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS moved (old INTEGER PRIMARY KEY, new INTEGER)")
+                self.conn.execute("DELETE FROM moved")
+                self.conn.executemany("INSERT INTO moved (old, new) VALUES (?, ?)",
+                                      zip(live_rows.tolist(), range(len(live_rows))))
+                self.conn.execute("UPDATE entries SET row = (SELECT new FROM moved WHERE old = entries.row)")
+                self.conn.execute("DELETE FROM info WHERE key IN ('ivf_covered', 'ivf_version')")
+                self._set_info(rows=len(live_rows), version=time.time_ns(), compacted=time.time_ns())
+
+        print(f"✅ Compacted vector store: {retired} retired rows removed")
+        return retired
+
+    def optimize(self, max_retired=0.2, max_unindexed=0.1):
+        """Compacts when over max_retired of the rows are retired, then rebuilds the IVF
+        lists (when nlist is set) once more than max_unindexed of the rows are not in them."""
+        with self.lock:
+            self._refresh()
+            if not self._rows:
+                return
+            if 1 - np.count_nonzero(self._live) / self._rows > max_retired:
+                self.compact()
+                self._refresh()
+
+            if self.nlist:
+                covered = int(self._info("ivf_covered") or 0)
+                if self._info("ivf_version") is None or (self._rows - covered) / self._rows > max_unindexed:
+                    self.build_ivf()
+
+    def close(self):
+        with self.lock:
+            self._vectors = self._scales = self._live = None
+            self.conn.close()